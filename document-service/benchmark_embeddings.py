@@ -0,0 +1,138 @@
+"""
+Benchmark embedding inference modes on our own PDFs.
+
+Chunks the PDFs exactly as ingestion does, then encodes every chunk with the
+fp32 model and with the dynamically quantized int8 model, at each requested
+PyTorch intra-op thread count. Reports encode throughput per mode and thread
+count, and how far int8 drifts from fp32: the cosine similarity between the
+two embeddings of each chunk, and how many of each chunk's top-k nearest
+neighbours stay the same.
+
+Usage:
+    python benchmark_embeddings.py --pdf-directory pdfs
+    python benchmark_embeddings.py --threads 1 2 4 --max-chunks 5000 --output benchmark.json
+"""
+import argparse
+import glob
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+
+from model_registry import INFERENCE_MODES, get_model
+from pdf_processor import process_pdf
+
+
+def load_chunks(pdf_directory: str, model_name: str, max_tokens: int, overlap_tokens: int, max_files: int, max_chunks: int) -> List[str]:
+    """Chunk PDFs the way ingestion does, up to max_chunks chunks."""
+    chunks: List[str] = []
+    for pdf_path in sorted(glob.glob(f"{pdf_directory}/*.pdf"))[:max_files or None]:
+        chunks.extend(process_pdf(pdf_path, max_tokens, overlap_tokens, model_name)["chunks"])
+        if len(chunks) >= max_chunks:
+            break
+    return chunks[:max_chunks]
+
+
+def encode(model, texts: List[str], batch_size: int) -> np.ndarray:
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+def time_encode(model, texts: List[str], batch_size: int, repeats: int) -> Dict[str, float]:
+    """Encode throughput, best of several runs after a warm-up encode."""
+    encode(model, texts[:batch_size], batch_size)
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        encode(model, texts, batch_size)
+        runs.append(time.perf_counter() - started)
+    best = min(runs)
+    return {"seconds": best, "chunks_per_second": len(texts) / best}
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def drift(baseline: np.ndarray, candidate: np.ndarray, k: int, queries: int, seed: int) -> Dict[str, Any]:
+    """Per-chunk cosine similarity between two embeddings of the same texts, and top-k neighbour overlap."""
+    baseline, candidate = normalize(baseline), normalize(candidate)
+    cosine = (baseline * candidate).sum(axis=1)
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(baseline), size=min(queries, len(baseline)), replace=False)
+    k = min(k, len(baseline) - 1)
+    overlap = 0
+    for i in sample:
+        # Skip the chunk itself, which is always its own nearest neighbour
+        expected = np.argsort(-(baseline @ baseline[i]))[1:k + 1]
+        found = np.argsort(-(candidate @ candidate[i]))[1:k + 1]
+        overlap += len(set(expected.tolist()) & set(found.tolist()))
+
+    return {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_p1": float(np.percentile(cosine, 1)),
+        "cosine_min": float(cosine.min()),
+        f"top{k}_overlap": overlap / (k * len(sample)) if k > 0 else 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fp32 against int8 embedding inference on CPU")
+    parser.add_argument("--pdf-directory", default="pdfs", help="Folder of PDFs to chunk and encode")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="sentence-transformers model")
+    parser.add_argument("--max-files", type=int, default=0, help="Most PDFs to read (0 = all)")
+    parser.add_argument("--max-chunks", type=int, default=2000, help="Most chunks to encode")
+    parser.add_argument("--overlap-tokens", type=int, default=32, help="Chunk overlap, as in CHUNK_OVERLAP_TOKENS")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass, as in ENCODE_BATCH_SIZE")
+    parser.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()], help="Intra-op thread counts to try")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per setting; the fastest counts")
+    parser.add_argument("--k", type=int, default=5, help="Nearest neighbours compared for drift")
+    parser.add_argument("--queries", type=int, default=200, help="Chunks sampled for the neighbour comparison")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the neighbour sample")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    models = {mode: get_model(args.model, mode) for mode in INFERENCE_MODES}
+    chunks = load_chunks(
+        args.pdf_directory, args.model, models["fp32"].max_seq_length,
+        args.overlap_tokens, args.max_files, args.max_chunks
+    )
+    if not chunks:
+        print(f"No chunks found in {args.pdf_directory}")
+        return
+    print(f"Benchmarking {args.model} on {len(chunks)} chunks, batch size {args.batch_size}")
+
+    throughput = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for mode, model in models.items():
+            result = {"mode": mode, "threads": threads, **time_encode(model, chunks, args.batch_size, args.repeats)}
+            throughput.append(result)
+            print(f"{mode:<5} threads={threads:<3} {result['chunks_per_second']:8.1f} chunks/s ({result['seconds']:.2f}s)")
+
+    embeddings = {mode: encode(model, chunks, args.batch_size) for mode, model in models.items()}
+    drift_result = drift(embeddings["fp32"], embeddings["int8"], args.k, args.queries, args.seed)
+    print(
+        f"int8 drift: cosine mean={drift_result['cosine_mean']:.4f} p1={drift_result['cosine_p1']:.4f} "
+        f"min={drift_result['cosine_min']:.4f}, " + ", ".join(
+            f"{key}={value:.3f}" for key, value in drift_result.items() if key.endswith("_overlap")
+        )
+    )
+
+    for threads in args.threads:
+        fp32, int8 = (
+            next(result for result in throughput if result["mode"] == mode and result["threads"] == threads)
+            for mode in ("fp32", "int8")
+        )
+        print(f"threads={threads}: int8 is {int8['chunks_per_second'] / fp32['chunks_per_second']:.2f}x fp32")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "chunks": len(chunks), "throughput": throughput, "drift": drift_result}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
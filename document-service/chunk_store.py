@@ -0,0 +1,172 @@
+import mmap
+import os
+import threading
+import zlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+
+
+class ChunkStore:
+    def __init__(self, directory: str):
+        """
+        Append-only store of zlib-compressed chunk texts, read through mmap.
+
+        Texts are appended to chunks.dat; chunks.idx is an append-only log of
+        "id offset length" entries (and "-id" deletions) replayed on startup.
+        Lookups decompress straight out of the memory-mapped data file, so
+        serving text never touches the vector index. Space of deleted or
+        overwritten chunks is reclaimed by compact().
+
+        Args:
+            directory: Directory holding chunks.dat and chunks.idx
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, "chunks.dat")
+        self.index_path = os.path.join(directory, "chunks.idx")
+
+        self._lock = threading.RLock()
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._load()
+
+        self._data = open(self.data_path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 1 and parts[0].startswith("-"):
+                    self._offsets.pop(parts[0][1:], None)
+                elif len(parts) == 3:
+                    offset, length = int(parts[1]), int(parts[2])
+                    # Ignore entries whose data never made it to disk
+                    if offset + length <= data_size:
+                        self._offsets[parts[0]] = (offset, length)
+        logger.info(f"Loaded chunk store with {len(self)} chunks")
+
+    @property
+    def stored_bytes(self) -> int:
+        """Size of the data file, including space held by deleted chunks."""
+        return os.path.getsize(self.data_path)
+
+    def put(self, chunk_ids: List[str], texts: List[str]):
+        """Store chunk texts, replacing any existing entries with the same IDs."""
+        with self._lock:
+            offset = self._data.seek(0, os.SEEK_END)
+            entries = []
+            for chunk_id, text in zip(chunk_ids, texts):
+                blob = zlib.compress((text or "").encode("utf-8"), COMPRESSION_LEVEL)
+                self._data.write(blob)
+                entries.append((chunk_id, offset, len(blob)))
+                offset += len(blob)
+            # Data before index, so a crash never leaves entries pointing past the end
+            self._data.flush()
+            self._index.write("".join(f"{chunk_id} {start} {length}\n" for chunk_id, start, length in entries))
+            self._index.flush()
+            for chunk_id, start, length in entries:
+                self._offsets[chunk_id] = (start, length)
+
+    def delete(self, chunk_ids: Iterable[str]):
+        """Forget chunks; their bytes stay in the data file until compaction."""
+        with self._lock:
+            removed = [chunk_id for chunk_id in chunk_ids if self._offsets.pop(chunk_id, None) is not None]
+            if removed:
+                self._index.write("".join(f"-{chunk_id}\n" for chunk_id in removed))
+                self._index.flush()
+
+    def delete_document(self, doc_id: str):
+        """Forget every chunk of a document (chunk IDs are f"{doc_id}_{i}")."""
+        prefix = f"{doc_id}_"
+        with self._lock:
+            self.delete([chunk_id for chunk_id in self._offsets if chunk_id.startswith(prefix)])
+
+    def get(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Texts of the given chunks; unknown IDs are left out."""
+        texts = {}
+        with self._lock:
+            locations = [(chunk_id, self._offsets.get(chunk_id)) for chunk_id in chunk_ids]
+            end = max((location[0] + location[1] for _, location in locations if location), default=0)
+            view = self._mapping(end)
+        for chunk_id, location in locations:
+            if location is not None:
+                start, length = location
+                texts[chunk_id] = zlib.decompress(view[start:start + length]).decode("utf-8")
+        return texts
+
+    def _mapping(self, end: int) -> Optional[mmap.mmap]:
+        # The data file only grows between compactions, so remap only when a
+        # read reaches past the current mapping
+        if end > self._mapped_size:
+            self._data.flush()
+            size = os.path.getsize(self.data_path)
+            if size:
+                with open(self.data_path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                self._mapped_size = size
+        return self._map
+
+    def clear(self):
+        """Forget every chunk and truncate the files."""
+        with self._lock:
+            self._offsets = {}
+            self._rewrite({})
+
+    def compact(self) -> int:
+        """
+        Rewrite the data file with only live chunks.
+
+        Returns:
+            Bytes reclaimed
+        """
+        with self._lock:
+            before = self.stored_bytes
+            view = self._mapping(before)
+            blobs = {chunk_id: bytes(view[start:start + length]) for chunk_id, (start, length) in self._offsets.items()} if view else {}
+            self._rewrite(blobs)
+            reclaimed = before - self.stored_bytes
+        logger.info(f"Compacted chunk store: reclaimed {reclaimed} bytes")
+        return reclaimed
+
+    def _rewrite(self, blobs: Dict[str, bytes]):
+        data_tmp = f"{self.data_path}.tmp"
+        index_tmp = f"{self.index_path}.tmp"
+        offsets = {}
+        offset = 0
+        with open(data_tmp, "wb") as data, open(index_tmp, "w", encoding="utf-8") as index:
+            for chunk_id, blob in blobs.items():
+                data.write(blob)
+                index.write(f"{chunk_id} {offset} {len(blob)}\n")
+                offsets[chunk_id] = (offset, len(blob))
+                offset += len(blob)
+
+        self._data.close()
+        self._index.close()
+        os.replace(data_tmp, self.data_path)
+        os.replace(index_tmp, self.index_path)
+        self._data = open(self.data_path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+
+        # Readers holding the old mapping keep the old file alive until they finish
+        self._offsets = offsets
+        self._map = None
+        self._mapped_size = 0
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
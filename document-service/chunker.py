@@ -0,0 +1,148 @@
+import re
+import threading
+import logging
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sentence ends followed by whitespace, or paragraph breaks
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+
+# Tokenizers are cached per process; ingestion workers load only the tokenizer, not the model
+_tokenizers: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def get_tokenizer(model_name: str):
+    """
+    Return the tokenizer of a sentence-transformers model, loading it on first use.
+
+    Args:
+        model_name: The sentence-transformers model name (e.g. all-MiniLM-L6-v2)
+    """
+    with _lock:
+        if model_name not in _tokenizers:
+            from transformers import AutoTokenizer
+
+            repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            logger.info(f"Loading tokenizer: {repo_id}")
+            _tokenizers[model_name] = AutoTokenizer.from_pretrained(repo_id)
+        return _tokenizers[model_name]
+
+
+class TokenChunker:
+    def __init__(self, tokenizer, max_tokens: int = 256, overlap_tokens: int = 32):
+        """
+        Sentence-aware chunker that keeps every chunk inside the model's token budget.
+
+        Args:
+            tokenizer: The embedding model's (fast) tokenizer
+            max_tokens: The model's max sequence length, including special tokens
+            overlap_tokens: Tokens of trailing sentences repeated at the start of the next chunk
+        """
+        self.tokenizer = tokenizer
+        self.budget = max_tokens - tokenizer.num_special_tokens_to_add()
+        self.overlap_tokens = min(overlap_tokens, self.budget // 2)
+
+    def _split_sentences(self, text: str) -> List[Tuple[int, int]]:
+        """Return the (start, end) character spans of the sentences in text."""
+        spans = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            if match.start() > start:
+                spans.append((start, match.start()))
+            start = match.end()
+        if start < len(text):
+            spans.append((start, len(text)))
+        return spans
+
+    def _page_units(self, page_number: int, text: str) -> List[Tuple[int, int, int, int]]:
+        """
+        Split a page into units that each fit the token budget.
+
+        Returns:
+            List of (page_number, char_start, char_end, token_count)
+        """
+        spans = self._split_sentences(text)
+        if not spans:
+            return []
+
+        token_ids = self.tokenizer(
+            [text[start:end] for start, end in spans],
+            add_special_tokens=False
+        )["input_ids"]
+
+        units = []
+        for (start, end), ids in zip(spans, token_ids):
+            if len(ids) <= self.budget:
+                units.append((page_number, start, end, len(ids)))
+                continue
+
+            # Sentence longer than the budget: cut it into token windows
+            offsets = self.tokenizer(
+                text[start:end],
+                add_special_tokens=False,
+                return_offsets_mapping=True
+            )["offset_mapping"]
+            for i in range(0, len(offsets), self.budget):
+                window = offsets[i:i + self.budget]
+                units.append((page_number, start + window[0][0], start + window[-1][1], len(window)))
+        return units
+
+    def chunk_pages(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Chunk a stream of pages, yielding each chunk as soon as it is full.
+
+        Character offsets refer to the cleaned text of the page they fall on.
+
+        Args:
+            pages: Iterable of (page number, page text)
+
+        Yields:
+            Dicts with the chunk text, token count, page_number/page_end and char_start/char_end
+        """
+        window: List[Tuple[int, int, int, int]] = []
+        window_tokens = 0
+        page_texts: Dict[int, str] = {}
+
+        def emit():
+            return {
+                "text": " ".join(page_texts[page][start:end] for page, start, end, _ in window),
+                "token_count": window_tokens,
+                "page_number": window[0][0],
+                "page_end": window[-1][0],
+                "char_start": window[0][1],
+                "char_end": window[-1][2]
+            }
+
+        for page_number, text in pages:
+            page_texts[page_number] = text
+
+            for unit in self._page_units(page_number, text):
+                if window and window_tokens + unit[3] > self.budget:
+                    yield emit()
+
+                    # Carry trailing sentences over as overlap, within the overlap budget
+                    overlap: List[Tuple[int, int, int, int]] = []
+                    overlap_tokens = 0
+                    for previous in reversed(window):
+                        if overlap_tokens + previous[3] > self.overlap_tokens:
+                            break
+                        overlap.insert(0, previous)
+                        overlap_tokens += previous[3]
+                    while overlap and overlap_tokens + unit[3] > self.budget:
+                        overlap_tokens -= overlap.pop(0)[3]
+                    window, window_tokens = overlap, overlap_tokens
+
+                window.append(unit)
+                window_tokens += unit[3]
+
+            # Only pages still referenced by the window need to stay in memory
+            live_pages = {unit[0] for unit in window}
+            for page in [page for page in page_texts if page not in live_pages and page != page_number]:
+                del page_texts[page]
+
+        if window:
+            yield emit()
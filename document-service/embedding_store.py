@@ -1,114 +1,814 @@
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
-from chromadb.utils import embedding_functions
+from chromadb.api.types import validate_where, validate_where_document
 import os
+import json
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import uuid
 
+from manifest import DocumentManifest
+from model_registry import get_model, SharedEmbeddingFunction
+from cache import LRUCache
+from keyword_index import BM25Index
+from chunk_store import ChunkStore
+from vector_backends import FlatIndexBackend, HNSW_BUILD_KEYS, VECTOR_BACKENDS, hnsw_mismatches, open_chroma_collection, resolve_hnsw_params
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def make_filters(where: Optional[Dict[str, Any]] = None, where_document: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Bundle Chroma where/where_document filters for one query, or None if unfiltered.
+    
+    Filters are validated here, before a query joins a shared batch, so a
+    malformed filter only fails its own request.
+    
+    Raises:
+        ValueError: If a filter is malformed
+    """
+    if not where and not where_document:
+        return None
+    if where:
+        validate_where(where)
+    if where_document:
+        validate_where_document(where_document)
+    return {"where": where or None, "where_document": where_document or None}
+
+def filters_key(filters: Optional[Dict[str, Any]]) -> str:
+    """Stable string form of a query's filters, for grouping and cache keys."""
+    return json.dumps(filters, sort_keys=True, default=str) if filters else ""
+
 class EmbeddingStore:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", persist_directory: str = "./chroma_db"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        persist_directory: str = "./chroma_db",
+        collection_name: str = "esg_documents",
+        write_batch_size: int = 512,
+        encode_batch_size: int = 64,
+        write_max_wait_seconds: float = 1.0,
+        query_cache_size: int = 4096,
+        result_cache_size: int = 1024,
+        vector_backend: str = "chroma",
+        flat_index_dtype: str = "float16",
+        hnsw_params: Optional[Dict[str, Any]] = None,
+        ingest_throttle=None,
+        inference_mode: str = "fp32",
+        query_embedding_cache: Optional[LRUCache] = None
+    ):
         """
         Initialize the embedding store.
         
         Args:
             model_name: The sentence-transformers model to use
             persist_directory: Where to store the ChromaDB data
+            collection_name: Name of the vector collection
+            write_batch_size: Chunks buffered before the shared writer flushes
+            encode_batch_size: Batch size for each model encode call
+            write_max_wait_seconds: Longest a buffered chunk waits before a flush
+            query_cache_size: Query embeddings kept in the LRU cache
+            result_cache_size: Search results kept in the LRU cache
+            vector_backend: "chroma" (HNSW) or "flat" (exact scan over a memory-mapped matrix)
+            flat_index_dtype: Storage type for the flat backend, "float16" or "int8"
+            hnsw_params: Chroma HNSW settings ("hnsw:M", "hnsw:construction_ef",
+                "hnsw:search_ef") overriding those recorded by tune_hnsw.py
+            ingest_throttle: Optional IngestThrottle that paces the writer's encodes under search load
+            inference_mode: "fp32", or "int8" to run a dynamically quantized model on CPU
+            query_embedding_cache: Query embedding cache shared with other stores using
+                the same model; a private one of query_cache_size entries if None
         """
         self.model_name = model_name
+        self.inference_mode = inference_mode
         self.persist_directory = persist_directory
+        self.collection_name = collection_name
         
         # Create persistence directory if it doesn't exist
         os.makedirs(persist_directory, exist_ok=True)
         
-        # Initialize the embedding model
-        logger.info(f"Loading embedding model: {model_name}")
-        self.sentence_transformer = SentenceTransformer(model_name)
+        # Set up ChromaDB with the shared sentence transformer; the model itself
+        # is loaded once per process on first use
+        self.embedding_function = SharedEmbeddingFunction(model_name, batch_size=encode_batch_size, inference_mode=inference_mode)
         
-        # Set up ChromaDB with sentence transformers
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"vector_backend must be one of {VECTOR_BACKENDS}")
+        self.vector_backend = vector_backend
         
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        # Deletes since the last compaction; Chroma keeps their space until the
+        # collection is rebuilt. Also records a collection swap in progress.
+        self.compaction_path = os.path.join(persist_directory, "compaction.json")
+        self.compaction_state = {"deleted_chunks": 0, "last_compacted_at": None, "last_reclaimed": 0, "swap_pending": False}
+        if os.path.exists(self.compaction_path):
+            with open(self.compaction_path, "r") as f:
+                self.compaction_state.update(json.load(f))
         
-        # Create or get the collection
-        self.collection = self.client.get_or_create_collection(
-            name="esg_documents",
-            embedding_function=self.embedding_function,
-            metadata={"description": "ESG document chunks"}
+        if vector_backend == "flat":
+            # Exact search over a memory-mapped matrix; same collection API subset as Chroma
+            self.client = None
+            self.collection = FlatIndexBackend(
+                os.path.join(persist_directory, "flat_index", collection_name),
+                dtype=flat_index_dtype
+            )
+        else:
+            # Initialize ChromaDB client
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            self._recover_rebuild(collection_name)
+            
+            # Create or get the collection; new collections use the tuned HNSW
+            # settings and rebuilds (compaction) switch existing ones over
+            self.hnsw_params = resolve_hnsw_params(persist_directory, collection_name, hnsw_params)
+            self.collection = open_chroma_collection(
+                self.client,
+                collection_name,
+                self.embedding_function,
+                self.hnsw_params
+            )
+        
+        # Serializes index writes with deletes and compaction
+        self._write_lock = threading.RLock()
+        
+        # Content-hash manifest of what is already indexed
+        self.manifest = DocumentManifest(os.path.join(persist_directory, "manifest.json"))
+        
+        # Chunks the manifest does not account for, e.g. from before documents
+        # were keyed by content hash (random doc_ids); each file's are dropped
+        # when the file is first indexed under its content hash
+        tracked = sum(entry["chunk_count"] for entry in self.manifest.documents.values())
+        self.has_untracked_chunks = self.collection.count() > tracked
+        if self.has_untracked_chunks:
+            logger.info(f"{self.collection.count() - tracked} chunks are not in the manifest; they are replaced file by file as files are indexed")
+        
+        # BM25 keyword index maintained alongside the collection
+        self.keyword_index = BM25Index(os.path.join(persist_directory, "keyword_index.pkl"))
+        if len(self.keyword_index) == 0 and self.collection.count() > 0:
+            self._rebuild_keyword_index()
+        
+        # Compressed chunk texts, served by ID without touching the vector index
+        self.chunk_store = ChunkStore(os.path.join(persist_directory, "chunk_store"))
+        if len(self.chunk_store) == 0 and self.collection.count() > 0:
+            self._rebuild_chunk_store()
+        
+        # Query embedding and search result caches. Result keys carry the index
+        # generation, which every write or delete bumps, so stale results are
+        # never served and simply age out of the LRU.
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self.query_embedding_cache = query_embedding_cache if query_embedding_cache is not None else LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self._lowercase_queries: Optional[bool] = None
+        
+        # Shared buffered writer that batches chunks across documents
+        self.encode_batch_size = encode_batch_size
+        self.writer = ChunkWriter(
+            self,
+            batch_size=write_batch_size,
+            encode_batch_size=encode_batch_size,
+            max_wait_seconds=write_max_wait_seconds,
+            throttle=ingest_throttle
         )
         
         logger.info("Embedding store initialized successfully")
         
-    def add_document_chunks(self, doc_id: str, chunks: List[str], metadata: Dict[str, Any]) -> List[str]:
+    @property
+    def sentence_transformer(self) -> SentenceTransformer:
+        """The process-wide model instance, shared with the Chroma embedding function."""
+        return get_model(self.model_name, self.inference_mode)
+        
+    def prepare_chunks(
+        self,
+        doc_id: str,
+        chunks: List[str],
+        metadata: Dict[str, Any],
+        chunk_metadatas: Optional[List[Dict[str, Any]]] = None,
+        start: int = 0
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
         """
-        Add document chunks to the collection.
+        Build the chunk IDs and per-chunk metadata for a document.
         
-        Args:
-            doc_id: Unique identifier for the document
-            chunks: List of text chunks
-            metadata: Document metadata
-            
-        Returns:
-            List of chunk IDs
+        Chunks may arrive in batches, so numbering starts at start; the total
+        is only known at the end and is kept in the manifest.
         """
-        if not chunks:
-            logger.warning(f"No chunks to add for document {doc_id}")
-            return []
-            
         # Generate unique IDs for each chunk
-        chunk_ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
+        chunk_ids = [f"{doc_id}_{start + i}" for i in range(len(chunks))]
         
         # Prepare metadata for each chunk
         metadatas = []
         for i in range(len(chunks)):
             chunk_metadata = metadata.copy()
-            chunk_metadata["chunk_index"] = i
-            chunk_metadata["total_chunks"] = len(chunks)
+            if chunk_metadatas:
+                chunk_metadata.update(chunk_metadatas[i])
+            chunk_metadata["doc_id"] = doc_id
+            chunk_metadata["chunk_index"] = start + i
             metadatas.append(chunk_metadata)
         
-        # Add chunks to the collection
-        logger.info(f"Adding {len(chunks)} chunks for document {doc_id}")
-        self.collection.add(
-            ids=chunk_ids,
-            documents=chunks,
-            metadatas=metadatas
+        return chunk_ids, metadatas
+        
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode a list of texts in fixed-size model batches."""
+        return self.sentence_transformer.encode(
+            texts,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True
+        ).tolist()
+        
+    def write_chunks(self, chunk_ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Write chunks with precomputed embeddings to the collection."""
+        with self._write_lock:
+            self.collection.upsert(
+                ids=chunk_ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+            self.keyword_index.add(chunk_ids, documents)
+            self.chunk_store.put(chunk_ids, documents)
+            self._bump_generation()
+        
+    def delete_document(self, doc_id: str) -> int:
+        """Remove all chunks belonging to a document and return how many there were."""
+        logger.info(f"Deleting chunks for document {doc_id}")
+        with self._write_lock:
+            chunk_ids = self.collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+            if chunk_ids:
+                self.collection.delete(ids=chunk_ids)
+            self.keyword_index.remove_document(doc_id)
+            self.chunk_store.delete_document(doc_id)
+            self._bump_generation()
+            self._record_deletes(len(chunk_ids))
+        return len(chunk_ids)
+        
+    def remove_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Delete a document and every file name that points at it.
+        
+        Returns:
+            The removed manifest entry, or None if the document is not indexed
+        """
+        entry = self.manifest.remove(doc_id)
+        if entry is not None:
+            self.delete_document(entry["doc_id"])
+        return entry
+        
+    def remove_file(self, file_name: str) -> Optional[str]:
+        """
+        Forget a file (by manifest key), deleting its document once no other file points at it.
+        
+        Returns:
+            The content hash the file name pointed at, or None if it was not indexed
+        """
+        content_hash = self.manifest.unlink(file_name)
+        self._release(content_hash)
+        if self.has_untracked_chunks:
+            self._drop_untracked(file_name)
+        return content_hash
+        
+    def begin_replacement(
+        self,
+        doc_id: str,
+        content_hash: str,
+        metadata: Dict[str, Any],
+        on_indexed: Optional[Callable[[Dict[str, Any], Optional[Exception]], None]] = None
+    ) -> Optional[str]:
+        """
+        Start replacing a document whose new chunks arrive in batches (see begin_document).
+        
+        Raises:
+            KeyError: If doc_id is not indexed
+        """
+        file_names = self.manifest.files_for(doc_id)
+        if not file_names:
+            raise KeyError(f"Document {doc_id} no longer exists")
+        
+        def relink(result: Dict[str, Any], error: Optional[Exception]):
+            if error is None:
+                # The first name was moved by begin_document; move the rest
+                for file_name in file_names[1:]:
+                    self._release(self.manifest.link(file_name, content_hash))
+            if on_indexed:
+                on_indexed(result, error)
+        
+        return self.begin_document(file_names[0], content_hash, metadata, on_indexed=relink)
+        
+    @contextmanager
+    def write_paused(self):
+        """
+        Hold off writes, deletes and compaction for the duration of the block.
+        
+        Buffered chunks are flushed first so the block sees them; searches
+        carry on. Used to read a consistent view, e.g. for a snapshot.
+        """
+        self.writer.flush()
+        with self._write_lock:
+            yield
+        
+    def _record_deletes(self, count: int):
+        if not count:
+            return
+        self.compaction_state["deleted_chunks"] += count
+        self._save_compaction_state()
+        
+    def _save_compaction_state(self):
+        tmp_path = f"{self.compaction_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.compaction_state, f)
+        os.replace(tmp_path, self.compaction_path)
+        
+    def reclaimable_chunks(self) -> int:
+        """Deleted chunks whose space compaction would reclaim."""
+        if self.vector_backend == "flat":
+            return self.collection.deleted_rows
+        return self.compaction_state["deleted_chunks"]
+        
+    def compaction_due(self, min_ratio: float = 0.2, min_chunks: int = 1000) -> bool:
+        """True once deleted chunks make up at least min_ratio of the index (and number min_chunks)."""
+        reclaimable = self.reclaimable_chunks()
+        total = self.collection.count() + reclaimable
+        return reclaimable >= min_chunks and total > 0 and reclaimable / total >= min_ratio
+        
+    def compact(self) -> int:
+        """
+        Reclaim the space of deleted chunks in the vector index.
+        
+        The flat backend rewrites its matrix without tombstoned rows. Chroma
+        only marks deleted HNSW nodes, so its collection is copied into a
+        fresh one built with the store's HNSW settings, which is swapped in;
+        this is also how changed M and construction_ef values take effect.
+        Writes wait while this runs; searches keep using the old index until
+        the swap.
+        
+        Returns:
+            Number of deleted chunks reclaimed
+        """
+        with self._write_lock:
+            reclaimable = self.reclaimable_chunks()
+            if self.vector_backend == "flat":
+                self.collection.compact()
+            else:
+                self._rebuild_collection()
+            self.chunk_store.compact()
+            self.compaction_state.update({
+                "deleted_chunks": 0,
+                "last_compacted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "last_reclaimed": reclaimable
+            })
+            self._save_compaction_state()
+        logger.info(f"Compaction reclaimed {reclaimable} deleted chunks")
+        return reclaimable
+        
+    @property
+    def hnsw_rebuild_pending(self) -> bool:
+        """True if the collection was built with other M or construction_ef values than configured."""
+        if self.vector_backend == "flat":
+            return False
+        mismatched = hnsw_mismatches(self.collection.metadata, self.hnsw_params)
+        return any(key in mismatched for key in HNSW_BUILD_KEYS)
+        
+    def _rebuild_collection(self, page_size: int = 1000):
+        old = self.collection
+        staging_name = f"{old.name}_compact"
+        try:
+            self.client.delete_collection(name=staging_name)
+        except ValueError:
+            pass
+        metadata = {key: value for key, value in (old.metadata or {}).items() if not key.startswith("hnsw:")}
+        staging = self.client.create_collection(
+            name=staging_name,
+            embedding_function=self.embedding_function,
+            metadata={**metadata, **self.hnsw_params}
         )
+        for page in self.iter_chunks(page_size, include=["embeddings", "documents", "metadatas"]):
+            staging.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"])
         
-        return chunk_ids
+        # Record that the copy is complete before dropping the old collection,
+        # so a crash mid-swap is finished on restart instead of losing both
+        self.compaction_state["swap_pending"] = True
+        self._save_compaction_state()
+        
+        # Swap before dropping the old collection so searches always have one
+        self.collection = staging
+        self.client.delete_collection(name=old.name)
+        staging.modify(name=old.name)
+        self.compaction_state["swap_pending"] = False
+        self._save_compaction_state()
         
-    def search_documents(self, query_text: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def _recover_rebuild(self, collection_name: str):
+        """Finish or discard a collection rebuild cut short by a crash."""
+        staging_name = f"{collection_name}_compact"
+        try:
+            staging = self.client.get_collection(name=staging_name, embedding_function=self.embedding_function)
+        except ValueError:
+            staging = None
+        
+        if staging is not None and self.compaction_state["swap_pending"]:
+            # The copy was complete; the old collection may already be gone
+            logger.warning(f"Finishing the interrupted swap of {staging_name} into {collection_name}")
+            try:
+                self.client.delete_collection(name=collection_name)
+            except ValueError:
+                pass
+            staging.modify(name=collection_name)
+        elif staging is not None:
+            # The copy was cut short; the old collection is intact
+            logger.warning(f"Dropping the incomplete rebuild {staging_name}")
+            self.client.delete_collection(name=staging_name)
+        
+        if self.compaction_state["swap_pending"]:
+            self.compaction_state["swap_pending"] = False
+            self._save_compaction_state()
+        
+    def iter_chunks(self, page_size: int = 1000, include: Optional[List[str]] = None):
+        """Yield every stored chunk in pages of collection.get results."""
+        include = include or ["documents", "metadatas"]
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            yield page
+            offset += len(page["ids"])
+        
+    def bulk_load(self, pages) -> int:
+        """
+        Store chunks with precomputed embeddings without touching the model.
+        
+        Args:
+            pages: Iterable of (ids, embeddings, documents, metadatas) tuples
+            
+        Returns:
+            Number of chunks loaded
+        """
+        loaded = 0
+        with self._write_lock:
+            for chunk_ids, embeddings, documents, metadatas in pages:
+                self.collection.upsert(ids=chunk_ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+                self.keyword_index.add(chunk_ids, documents)
+                self.chunk_store.put(chunk_ids, documents)
+                loaded += len(chunk_ids)
+            self._bump_generation()
+        return loaded
+        
+    def clear(self, page_size: int = 1000):
+        """Remove every chunk, keyword index entry and manifest entry."""
+        logger.info("Clearing the embedding store")
+        with self._write_lock:
+            while True:
+                chunk_ids = self.collection.get(include=[], limit=page_size)["ids"]
+                if not chunk_ids:
+                    break
+                self.collection.delete(ids=chunk_ids)
+                self.keyword_index.remove(chunk_ids)
+                self._record_deletes(len(chunk_ids))
+            # The index is empty now, so this checkpoint is cheap and drops the log
+            self.keyword_index.checkpoint()
+            self.chunk_store.clear()
+            self.manifest.clear()
+            self.has_untracked_chunks = False
+            self._bump_generation()
+        
+    def _rebuild_keyword_index(self, page_size: int = 1000):
+        """Build the keyword index from the chunks already in the collection."""
+        logger.info("Building keyword index from existing collection")
+        for page in self.iter_chunks(page_size, include=["documents"]):
+            self.keyword_index.add(page["ids"], page["documents"])
+        self.keyword_index.checkpoint()
+        logger.info(f"Keyword index built with {len(self.keyword_index)} chunks")
+        
+    def _rebuild_chunk_store(self, page_size: int = 1000):
+        """Fill the chunk store from the texts already in the collection."""
+        logger.info("Building chunk store from existing collection")
+        for page in self.iter_chunks(page_size, include=["documents"]):
+            self.chunk_store.put(page["ids"], page["documents"])
+        logger.info(f"Chunk store built with {len(self.chunk_store)} chunks")
+        
+    def get_chunk_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Texts of the given chunks from the chunk store; unknown IDs are left out."""
+        return self.chunk_store.get(chunk_ids)
+        
+    def _bump_generation(self):
+        """Mark the index as changed so cached search results are no longer used."""
+        with self._generation_lock:
+            self.generation += 1
+        
+    def begin_document(
+        self,
+        file_name: str,
+        content_hash: str,
+        metadata: Dict[str, Any],
+        on_indexed: Optional[Callable[[Dict[str, Any], Optional[Exception]], None]] = None
+    ) -> Optional[str]:
+        """
+        Start indexing a file whose chunks arrive in batches as they are extracted.
+        
+        Pass the batches to add_chunks, then call end_document. The manifest
+        is only updated once every chunk is stored, so a changed file never
+        disappears from search while it is being replaced.
+        
+        Args:
+            file_name: Manifest key of the source file (manifest.source_key)
+            content_hash: SHA-256 of the file contents
+            metadata: Document metadata
+            on_indexed: Called with the result (document ID, chunk count, embed_seconds
+                and write_seconds) and any error once the chunks are stored
+            
+        Returns:
+            The document ID to stream chunks to, or None if there is nothing to
+            write: the content is already indexed, or being written for another
+            file, and on_indexed is called once it is
+        """
+        result = self.link_file(file_name, content_hash)
+        if result is not None:
+            if on_indexed:
+                on_indexed(result, None)
+            return None
+        
+        doc_id = content_hash
+        
+        def finalize(error: Optional[Exception], info: Dict[str, Any]):
+            if error is None:
+                if info["chunk_count"] == 0:
+                    logger.warning(f"No chunks to add for document {doc_id}")
+                # Drop the old version once nothing refers to it any more
+                previous_hash = self.manifest.record(file_name, content_hash, doc_id, info["chunk_count"])
+                self._release(previous_hash)
+                if previous_hash is None and self.has_untracked_chunks:
+                    self._drop_untracked(file_name)
+            if on_indexed:
+                on_indexed({"doc_id": doc_id, **info}, error)
+        
+        return doc_id if self.writer.begin(doc_id, metadata, on_written=finalize) else None
+        
+    def link_file(self, file_name: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Point a file at identical content that is already indexed, without extracting it.
+        
+        Returns:
+            Dict with the document ID and chunk count, or None if the content is not indexed
+        """
+        existing = self.manifest.get_document(content_hash)
+        if not existing:
+            return None
+        previous_hash = self.manifest.link(file_name, content_hash)
+        self._release(previous_hash)
+        if previous_hash is None and self.has_untracked_chunks:
+            self._drop_untracked(file_name)
+        return {"doc_id": existing["doc_id"], "chunk_count": existing["chunk_count"]}
+        
+    def add_chunks(self, doc_id: str, chunks: List[str], chunk_metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Queue the next batch of a begun document's chunks on the shared writer."""
+        return self.writer.add_chunks(doc_id, chunks, chunk_metadatas)
+        
+    def end_document(self, doc_id: str, error: Optional[Exception] = None):
+        """
+        Mark a begun document complete, or abandon it after an extraction error.
+        
+        An abandoned document's callbacks get the error and the chunks it
+        already stored are deleted.
+        """
+        if self.writer.end(doc_id, error) and error is not None:
+            self.delete_document(doc_id)
+        
+    def _drop_untracked(self, file_name: str) -> int:
+        """Delete a file's chunks that belong to no document in the manifest (e.g. legacy random doc_ids)."""
+        found = self.collection.get(where={"file_name": os.path.basename(file_name)}, include=["metadatas"])
+        stale = {
+            metadata.get("doc_id")
+            for metadata in found["metadatas"] or []
+            if metadata and metadata.get("doc_id") and self.manifest.get_document(metadata["doc_id"]) is None
+        }
+        removed = sum(self.delete_document(doc_id) for doc_id in stale)
+        if removed:
+            logger.info(f"Dropped {removed} untracked chunks of {file_name}")
+        return removed
+        
+    def _release(self, content_hash: Optional[str]):
+        """Delete a replaced document's chunks if no file name refers to it."""
+        if not content_hash:
+            return
+        stale = self.manifest.release(content_hash)
+        if stale:
+            self.delete_document(stale["doc_id"])
+        
+    def search_documents(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for documents similar to the query.
         
         Args:
             query_text: The search query text
             n_results: Number of results to return
+            where: Optional Chroma metadata filter (e.g. {"file_name": "..."})
+            where_document: Optional Chroma document filter (e.g. {"$contains": "..."})
             
         Returns:
             List of search results with text and metadata
         """
-        # Search the collection
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
-        )
+        filters = make_filters(where, where_document)
+        return self.search_batch([query_text], [n_results], [filters])[0]
+        
+    def search_batch(
+        self,
+        query_texts: List[str],
+        n_results: List[int],
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        return_exceptions: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once.
+        
+        All queries are encoded in one model call. Queries that share the same
+        filters run as a single multi-query collection lookup, with the filters
+        applied inside the index.
         
-        # Format results
+        Args:
+            query_texts: The search query texts
+            n_results: Number of results to return for each query
+            filters: Optional per-query filters built with make_filters
+            query_embeddings: The queries already encoded, e.g. once for every
+                shard searched; encoded here if None
+            return_exceptions: If a filter group's lookup fails, put the exception
+                in place of its queries' results instead of raising, so the
+                other groups still return
+            
+        Returns:
+            One list of search results (or exception) per query, in input order
+        """
+        if not query_texts:
+            return []
+        filters = filters or [None] * len(query_texts)
+        
+        # Serve repeated questions from the result cache
+        generation = self.generation
+        filter_keys = [filters_key(query_filters) for query_filters in filters]
+        keys = [
+            (self.normalize_query(query_texts[i]), n_results[i], filter_keys[i], generation)
+            for i in range(len(query_texts))
+        ]
+        formatted = [self.result_cache.get(key) for key in keys]
+        misses = [i for i in range(len(query_texts)) if formatted[i] is None]
+        if not misses:
+            return formatted
+        
+        # Encode every remaining query in one call, then query once per distinct filter
+        if query_embeddings is not None:
+            embeddings = {i: query_embeddings[i] for i in misses}
+        else:
+            embeddings = dict(zip(misses, self.encode_queries([query_texts[i] for i in misses])))
+        groups: Dict[str, List[int]] = {}
+        for i in misses:
+            groups.setdefault(filter_keys[i], []).append(i)
+        
+        for group in groups.values():
+            query_filters = filters[group[0]] or {}
+            try:
+                results = self.collection.query(
+                    query_embeddings=[embeddings[i] for i in group],
+                    n_results=max(n_results[i] for i in group),
+                    where=query_filters.get("where"),
+                    where_document=query_filters.get("where_document")
+                )
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                logger.error(f"Search with filters {filter_keys[group[0]]} failed: {str(e)}")
+                for i in group:
+                    formatted[i] = e
+                continue
+            
+            for j, i in enumerate(group):
+                formatted[i] = self._format_results(results, j)[:n_results[i]]
+                self.result_cache.put(keys[i], formatted[i])
+        
+        return formatted
+        
+    def keyword_search(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for chunks containing the query's terms, ranked by BM25.
+        
+        Args:
+            query_text: The search query text
+            n_results: Number of results to return
+            where: Optional Chroma metadata filter
+            where_document: Optional Chroma document filter
+            
+        Returns:
+            List of search results with text and metadata; higher scores are better
+        """
+        # Restrict scoring to the chunks that pass the filters
+        allowed_ids = None
+        if where or where_document:
+            allowed_ids = set(self.collection.get(where=where, where_document=where_document, include=[])["ids"])
+            if not allowed_ids:
+                return []
+        
+        hits = self.keyword_index.search(query_text, n_results, allowed_ids)
+        if not hits:
+            return []
+        
+        # Fetch text and metadata for the ranked chunks only
+        chunk_ids = [chunk_id for chunk_id, _ in hits]
+        found = self.collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: (found["documents"][i], found["metadatas"][i] if found["metadatas"] else {})
+            for i, chunk_id in enumerate(found["ids"])
+        }
+        
+        return [
+            {
+                "chunk_id": chunk_id,
+                "text": by_id[chunk_id][0],
+                "metadata": by_id[chunk_id][1] or {},
+                "score": score
+            }
+            for chunk_id, score in hits
+            if chunk_id in by_id
+        ]
+        
+    def normalize_query(self, query_text: str) -> str:
+        """Normalize a query for cache keys without changing what the model sees."""
+        query_text = " ".join(query_text.split())
+        if self._lowercase_queries is None:
+            # Case only matters to the cache if the model's tokenizer is cased
+            tokenizer = getattr(self.sentence_transformer, "tokenizer", None)
+            self._lowercase_queries = bool(getattr(tokenizer, "do_lower_case", False))
+        return query_text.lower() if self._lowercase_queries else query_text
+        
+    def encode_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """Encode queries, reusing cached embeddings and encoding the rest in one call."""
+        keys = [self.normalize_query(text) for text in query_texts]
+        embeddings = [self.query_embedding_cache.get(key) for key in keys]
+        misses = [i for i in range(len(keys)) if embeddings[i] is None]
+        
+        if misses:
+            encoded = self.encode([keys[i] for i in misses])
+            for i, embedding in zip(misses, encoded):
+                embeddings[i] = embedding
+                self.query_embedding_cache.put(keys[i], embedding)
+        
+        return embeddings
+        
+    def get_index_settings(self) -> Dict[str, Any]:
+        """The vector backend in use and its index settings."""
+        compaction = {
+            **self.compaction_state,
+            "reclaimable_chunks": self.reclaimable_chunks(),
+            "chunk_store_chunks": len(self.chunk_store),
+            "chunk_store_bytes": self.chunk_store.stored_bytes
+        }
+        if self.vector_backend == "flat":
+            return {
+                "backend": "flat",
+                "dtype": self.collection.dtype,
+                "rows": self.collection.rows,
+                "deleted_rows": self.collection.deleted_rows,
+                "compaction": compaction
+            }
+        metadata = self.collection.metadata or {}
+        return {
+            "backend": "chroma",
+            "hnsw": {key: value for key, value in metadata.items() if key.startswith("hnsw:")},
+            "hnsw_rebuild_pending": self.hnsw_rebuild_pending,
+            "compaction": compaction
+        }
+        
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for the query and result caches."""
+        return {
+            "generation": self.generation,
+            "query_embeddings": self.query_embedding_cache.get_stats(),
+            "search_results": self.result_cache.get_stats()
+        }
+        
+    def _format_results(self, results: Dict[str, Any], query_index: int) -> List[Dict[str, Any]]:
+        """Format one query's slice of a collection.query response."""
         formatted_results = []
         
-        if results["documents"] and results["documents"][0]:
-            for i in range(len(results["documents"][0])):
+        documents = results["documents"][query_index] if results["documents"] else None
+        if documents:
+            metadatas = results["metadatas"][query_index] if results["metadatas"] else None
+            distances = results["distances"][query_index] if results["distances"] else None
+            for i in range(len(documents)):
                 formatted_results.append({
-                    "chunk_id": results["ids"][0][i],
-                    "text": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i] if results["metadatas"] and results["metadatas"][0] else {},
-                    "score": results["distances"][0][i] if results["distances"] and results["distances"][0] else None
+                    "chunk_id": results["ids"][query_index][i],
+                    "text": documents[i],
+                    "metadata": metadatas[i] if metadatas else {},
+                    "score": distances[i] if distances else None
                 })
         
         return formatted_results
@@ -116,3 +816,278 @@ class EmbeddingStore:
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text."""
         return self.sentence_transformer.encode(text).tolist()
+
+
+
+class ChunkWriter:
+    def __init__(self, store: EmbeddingStore, batch_size: int = 512, encode_batch_size: int = 64, max_wait_seconds: float = 1.0, throttle=None):
+        """
+        Buffer chunks across documents and write them in large batches.
+        
+        Chunks are flushed once batch_size of them are pending or the oldest
+        has waited max_wait_seconds. Each flush encodes all pending texts in one
+        model call and writes them to the collection in a single upsert.
+        
+        Args:
+            store: The embedding store to write into
+            batch_size: Number of pending chunks that triggers a flush
+            encode_batch_size: Batch size for the model encode call
+            max_wait_seconds: Longest a chunk waits before it is flushed
+            throttle: Optional IngestThrottle; the batch is then encoded one
+                model batch at a time so searches can get in between
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.encode_batch_size = encode_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.throttle = throttle
+        
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[Tuple[str, str, str, Dict[str, Any]]] = []
+        self._oldest: Optional[float] = None
+        self._remaining: Dict[str, int] = {}
+        self._open: Dict[str, Dict[str, Any]] = {}
+        self._callbacks: Dict[str, List[Callable[[Optional[Exception], Dict[str, Any]], None]]] = {}
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        
+        self.stats = {
+            "batches": 0,
+            "chunks_written": 0,
+            "encode_seconds": 0.0,
+            "write_seconds": 0.0,
+            "throttled_seconds": 0.0
+        }
+        
+        # Background thread that enforces the time threshold
+        self._stopped = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+        
+    def begin(
+        self,
+        doc_id: str,
+        metadata: Dict[str, Any],
+        on_written: Optional[Callable[[Optional[Exception], Dict[str, Any]], None]] = None
+    ) -> bool:
+        """
+        Open a document whose chunks will arrive in batches.
+        
+        Document IDs are content hashes, so a second file with the same
+        content can arrive while the first one's chunks are still in flight.
+        Its chunks are then not queued again (the same IDs twice in one
+        upsert would fail the whole batch); its callback simply waits for
+        the copy in flight.
+        
+        Args:
+            doc_id: Unique identifier for the document
+            metadata: Document metadata, added to every chunk's metadata
+            on_written: Called with None once the document is ended and every
+                chunk is stored, or with the error, and the document's chunk
+                count and share of embed and write seconds
+            
+        Returns:
+            True if the caller should send the chunks, False if the document is already in flight
+        """
+        with self._lock:
+            if on_written:
+                self._callbacks.setdefault(doc_id, []).append(on_written)
+            if doc_id in self._remaining:
+                return False
+            self._remaining[doc_id] = 0
+            self._open[doc_id] = metadata
+            self._timings[doc_id] = {"chunk_count": 0, "embed_seconds": 0.0, "write_seconds": 0.0}
+            return True
+        
+    def add_chunks(self, doc_id: str, chunks: List[str], chunk_metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        Queue the next batch of an open document's chunks.
+        
+        Returns:
+            List of chunk IDs (none if the document already failed)
+        """
+        with self._lock:
+            if doc_id not in self._open:
+                return []
+            timings = self._timings[doc_id]
+            chunk_ids, metadatas = self.store.prepare_chunks(doc_id, chunks, self._open[doc_id], chunk_metadatas, timings["chunk_count"])
+            if not self._pending and chunks:
+                self._oldest = time.monotonic()
+            self._pending.extend(zip([doc_id] * len(chunks), chunk_ids, chunks, metadatas))
+            self._remaining[doc_id] += len(chunks)
+            timings["chunk_count"] += len(chunks)
+            full = len(self._pending) >= self.batch_size
+        
+        if full:
+            self.flush(only_full=True)
+        
+        return chunk_ids
+        
+    def end(self, doc_id: str, error: Optional[Exception] = None) -> bool:
+        """
+        Close an open document: its callbacks run once its last chunk is stored.
+        
+        With an error (e.g. extraction failed halfway), its chunks still
+        pending are dropped and its callbacks get the error at once.
+        
+        Returns:
+            True if the document was open, False if it had already failed
+        """
+        with self._lock:
+            if self._open.pop(doc_id, None) is None:
+                return False
+            if error is None and self._remaining[doc_id] > 0:
+                return True
+            if error is not None:
+                self._pending = [item for item in self._pending if item[0] != doc_id]
+                if not self._pending:
+                    self._oldest = None
+            del self._remaining[doc_id]
+            callbacks = self._callbacks.pop(doc_id, [])
+            timings = self._timings.pop(doc_id)
+        
+        self._notify(doc_id, callbacks, error, timings)
+        return True
+        
+    def flush(self, only_full: bool = False):
+        """
+        Write pending chunks.
+        
+        Args:
+            only_full: Stop once fewer than batch_size chunks remain
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending or (only_full and len(self._pending) < self.batch_size):
+                        return
+                    batch = self._pending[:self.batch_size]
+                    del self._pending[:self.batch_size]
+                    self._oldest = time.monotonic() if self._pending else None
+                
+                self._write_batch(batch)
+        
+    def _write_batch(self, batch: List[Tuple[str, str, str, Dict[str, Any]]]):
+        doc_ids = list(dict.fromkeys(item[0] for item in batch))
+        try:
+            encode_seconds, write_seconds = self._store_batch(batch)
+        except Exception as e:
+            if len(doc_ids) > 1:
+                # One bad document should not fail every document sharing its batch
+                logger.warning(f"Batch of {len(batch)} chunks from {len(doc_ids)} documents failed ({str(e)}); retrying each document alone")
+                for doc_id in doc_ids:
+                    self._write_batch([item for item in batch if item[0] == doc_id])
+                return
+            logger.error(f"Error writing chunks of document {doc_ids[0]}: {str(e)}")
+            self._settle(batch, e, 0.0, 0.0)
+            return
+        self._settle(batch, None, encode_seconds, write_seconds)
+        
+    def _store_batch(self, batch: List[Tuple[str, str, str, Dict[str, Any]]]) -> Tuple[float, float]:
+        """Encode and write one batch, returning its encode and write seconds."""
+        texts = [item[2] for item in batch]
+        encode_start = time.perf_counter()
+        throttled = 0.0
+        if self.throttle is None:
+            embeddings = self.store.sentence_transformer.encode(
+                texts,
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True
+            ).tolist()
+        else:
+            # encode() only sorts by length within a call, so sort the whole
+            # batch first and keep each slice's padding short
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+            embeddings = [None] * len(texts)
+            for start in range(0, len(texts), self.encode_batch_size):
+                step = order[start:start + self.encode_batch_size]
+                step_start = time.perf_counter()
+                vectors = self.store.sentence_transformer.encode(
+                    [texts[i] for i in step],
+                    batch_size=self.encode_batch_size,
+                    convert_to_numpy=True
+                ).tolist()
+                for i, vector in zip(step, vectors):
+                    embeddings[i] = vector
+                step_end = time.perf_counter()
+                self.throttle.after_encode(step_end - step_start)
+                throttled += time.perf_counter() - step_end
+        write_start = time.perf_counter()
+        self.store.write_chunks(
+            [item[1] for item in batch],
+            embeddings,
+            texts,
+            [item[3] for item in batch]
+        )
+        write_end = time.perf_counter()
+        encode_seconds = write_start - encode_start - throttled
+        write_seconds = write_end - write_start
+        
+        self.stats["batches"] += 1
+        self.stats["chunks_written"] += len(batch)
+        self.stats["encode_seconds"] += encode_seconds
+        self.stats["throttled_seconds"] += throttled
+        self.stats["write_seconds"] += write_seconds
+        logger.info(f"Wrote batch of {len(batch)} chunks from {len(set(item[0] for item in batch))} documents")
+        return encode_seconds, write_seconds
+        
+    def _settle(self, batch: List[Tuple[str, str, str, Dict[str, Any]]], error: Optional[Exception], encode_seconds: float, write_seconds: float):
+        # Notify documents that are now fully written (or failed), charging each
+        # its share of the batch's time by chunk count
+        finished = []
+        share = 1.0 / len(batch)
+        with self._lock:
+            for doc_id in [item[0] for item in batch]:
+                if doc_id not in self._remaining:
+                    continue
+                self._remaining[doc_id] -= 1
+                timings = self._timings[doc_id]
+                timings["embed_seconds"] += encode_seconds * share
+                timings["write_seconds"] += write_seconds * share
+                if error is not None or (self._remaining[doc_id] == 0 and doc_id not in self._open):
+                    del self._remaining[doc_id]
+                    self._open.pop(doc_id, None)
+                    finished.append((doc_id, self._callbacks.pop(doc_id, []), self._timings.pop(doc_id)))
+            if error is not None:
+                # Chunks of failed documents still waiting would only be orphans
+                failed = {doc_id for doc_id, _, _ in finished}
+                self._pending = [item for item in self._pending if item[0] not in failed]
+                if not self._pending:
+                    self._oldest = None
+        
+        for doc_id, callbacks, timings in finished:
+            if error is not None:
+                # Earlier batches of a failed document may be stored; the manifest
+                # never records it, so drop them rather than leave orphans
+                try:
+                    self.store.delete_document(doc_id)
+                except Exception as e:
+                    logger.error(f"Error deleting chunks of failed document {doc_id}: {str(e)}")
+            self._notify(doc_id, callbacks, error, timings)
+        
+    def _notify(self, doc_id: str, callbacks: List[Callable[[Optional[Exception], Dict[str, Any]], None]], error: Optional[Exception], timings: Dict[str, Any]):
+        for callback in callbacks:
+            try:
+                callback(error, dict(timings))
+            except Exception as e:
+                logger.error(f"Error in write callback for document {doc_id}: {str(e)}")
+        
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.max_wait_seconds / 2):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_wait_seconds
+                idle = self._oldest is None
+            if due:
+                self.flush()
+            elif idle:
+                # Fold a grown keyword log into its checkpoint while nothing is being
+                # written, outside the store's write lock
+                try:
+                    self.store.keyword_index.checkpoint(force=False)
+                except Exception as e:
+                    logger.error(f"Error checkpointing keyword index: {str(e)}")
+        
+    def close(self):
+        """Flush everything and stop the background timer."""
+        self._stopped.set()
+        self.flush()
@@ -0,0 +1,45 @@
+from typing import Any, Dict, List
+
+# Standard RRF damping constant; larger values flatten the contribution of top ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(ranked_lists: Dict[str, List[Dict[str, Any]]], n_results: int = 5, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Fuse several ranked result lists with reciprocal rank fusion.
+
+    Each chunk scores sum(1 / (k + rank)) over the lists it appears in, so
+    only ranks matter and scores on different scales (distances, BM25) never
+    have to be compared directly.
+
+    Args:
+        ranked_lists: Result lists keyed by source name (e.g. "vector", "keyword"), best first
+        n_results: Number of fused results to return
+        k: RRF damping constant
+
+    Returns:
+        Fused results, best first. "score" is the fused RRF score (higher is
+        better); "scores" and "ranks" hold each source's own score and 1-based
+        rank, or None where the chunk did not appear.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+
+    for source, results in ranked_lists.items():
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["chunk_id"])
+            if entry is None:
+                entry = {
+                    "chunk_id": result["chunk_id"],
+                    "text": result.get("text"),
+                    "metadata": result.get("metadata", {}),
+                    "shard": result.get("shard"),
+                    "score": 0.0,
+                    "scores": {name: None for name in ranked_lists},
+                    "ranks": {name: None for name in ranked_lists}
+                }
+                fused[result["chunk_id"]] = entry
+            entry["score"] += 1.0 / (k + rank)
+            entry["scores"][source] = result.get("score")
+            entry["ranks"][source] = rank
+
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:n_results]
@@ -0,0 +1,78 @@
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when an inference pool already has its maximum number of pending calls."""
+
+
+class InferencePool:
+    def __init__(self, name: str, threads: int = 4, max_queue: int = 64):
+        """
+        Bounded thread pool for blocking model and index calls made from async endpoints.
+
+        Calls run off the event loop, so slow encodes and queries no longer stall
+        other requests. At most threads calls run at once and at most max_queue
+        more wait; anything beyond that is rejected instead of queueing forever.
+
+        Args:
+            name: Name used for the worker threads and in stats
+            threads: Number of worker threads
+            max_queue: Calls allowed to wait for a free thread
+        """
+        self.name = name
+        self.threads = threads
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=name)
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {
+            "completed": 0,
+            "rejected": 0,
+            "max_depth": 0
+        }
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking function on the pool and await its result.
+
+        Raises:
+            QueueFullError: If the pool is saturated
+        """
+        with self._lock:
+            if self._pending >= self.threads + self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFullError(f"{self.name} pool is saturated ({self._pending} pending)")
+            self._pending += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], self._pending)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.stats["completed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current queue depth and counters."""
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                **self.stats
+            }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls to finish."""
+        self.executor.shutdown(wait=True)
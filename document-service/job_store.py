@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-file states, in pipeline order
+FILE_STATES = ("queued", "extracting", "embedding", "done", "skipped", "failed")
+STAGES = ("extract", "chunk", "embed", "write")
+
+# Jobs in these states were cut short by a restart and can be resumed
+UNFINISHED_JOB_STATES = ("queued", "processing", "paused")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    owner TEXT,
+    created_at TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    file_path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    doc_id TEXT,
+    page_count INTEGER,
+    chunk_count INTEGER,
+    extract_seconds REAL,
+    chunk_seconds REAL,
+    embed_seconds REAL,
+    write_seconds REAL,
+    error TEXT,
+    PRIMARY KEY (job_id, file_path)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    def __init__(self, db_path: str):
+        """
+        Durable record of ingestion jobs and the state of every file in them.
+
+        Jobs and per-file states (queued, extracting, embedding, done,
+        skipped, failed) live in SQLite, with the extract, chunk, embed and
+        write seconds of each file, so status survives restarts and is
+        shared by every worker process on the host. Each job records the
+        process that owns it ("pid:instance", since a restarted container
+        often reuses the pid); a job whose owner is gone can be claimed and
+        resumed from its unfinished files.
+
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = db_path
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        # WAL lets other worker processes read status while this one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def create(self, job_id: str, priority: str, file_paths: List[str], params: Dict[str, Any]):
+        """Register a queued job, owned by this process, with all its files queued."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, priority, status, params, owner, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, priority, json.dumps(params), self.owner, datetime.utcnow().isoformat())
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, position, file_path, state) VALUES (?, ?, ?, 'queued')",
+                [(job_id, position, file_path) for position, file_path in enumerate(file_paths)]
+            )
+            self._db.commit()
+
+    def set_status(self, job_id: str, status: str):
+        """Update a job's status, stamping when it starts and finishes."""
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, "
+            "started_at = CASE WHEN ? = 'processing' THEN COALESCE(started_at, ?) ELSE started_at END, "
+            "finished_at = CASE WHEN ? IN ('completed', 'failed', 'cancelled') THEN ? ELSE NULL END "
+            "WHERE job_id = ?",
+            (status, status, now, status, now, job_id)
+        )
+
+    def update_file(self, job_id: str, file_path: str, state: Optional[str], **fields):
+        """
+        Move a file to a new state (or keep its state if None), recording any
+        of doc_id, page_count, chunk_count, error and the <stage>_seconds timings.
+        """
+        if state is not None and state not in FILE_STATES:
+            raise ValueError(f"Unknown file state {state}")
+        columns = ([] if state is None else ["state = ?"]) + [f"{name} = ?" for name in fields]
+        if not columns:
+            return
+        self._execute(
+            f"UPDATE job_files SET {', '.join(columns)} WHERE job_id = ? AND file_path = ?",
+            (*([] if state is None else [state]), *fields.values(), job_id, file_path)
+        )
+
+    def exists(self, job_id: str) -> bool:
+        return bool(self._query("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)))
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        rows = self._query("SELECT status FROM jobs WHERE job_id = ?", (job_id,))
+        return rows[0]["status"] if rows else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        A job's status, counts, indexed documents, throughput and stage timings.
+
+        Returns:
+            The job summary, or None if the job is unknown
+        """
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+        job = rows[0]
+        files = self._query("SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,))
+        params = json.loads(job["params"])
+
+        counts = {state: 0 for state in FILE_STATES}
+        for row in files:
+            counts[row["state"]] += 1
+        stages = {stage: sum(row[f"{stage}_seconds"] or 0.0 for row in files) for stage in STAGES}
+        pages = sum(row["page_count"] or 0 for row in files)
+        chunks = sum(row["chunk_count"] or 0 for row in files if row["state"] == "done")
+        elapsed = ((job["finished_at"] or time.time()) - job["started_at"]) if job["started_at"] else 0.0
+        writer_busy = stages["embed"] + stages["write"]
+
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "priority": job["priority"],
+            "processed_count": counts["done"] + counts["skipped"],
+            "total_count": len(files),
+            "skipped_count": counts["skipped"],
+            "failed_files": [os.path.basename(row["file_path"]) for row in files if row["state"] == "failed"],
+            "documents": [
+                {
+                    "file_name": os.path.basename(row["file_path"]),
+                    "doc_id": row["doc_id"],
+                    "chunk_count": row["chunk_count"]
+                }
+                for row in files if row["state"] == "done"
+            ],
+            "file_states": counts,
+            "throughput": {
+                "workers": params.get("workers", 1),
+                "pages_extracted": pages,
+                "chunks_written": chunks,
+                "pages_per_second": pages / elapsed if elapsed > 0 else 0.0,
+                "chunks_per_second": chunks / writer_busy if writer_busy > 0 else 0.0
+            },
+            # Summed per-file seconds; the largest is the stage to scale up
+            "stages": {
+                **{f"{stage}_seconds": seconds for stage, seconds in stages.items()},
+                "bottleneck": max(stages, key=stages.get) if any(stages.values()) else None
+            }
+        }
+
+    def get_files(self, job_id: str) -> List[Dict[str, Any]]:
+        """Every file of a job with its state, result and stage timings."""
+        rows = self._query("SELECT * FROM job_files WHERE job_id = ? ORDER BY position", (job_id,))
+        return [
+            {key: row[key] for key in row.keys() if key not in ("job_id", "position")}
+            for row in rows
+        ]
+
+    def list_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """The most recent jobs with their file counts, newest first."""
+        rows = self._query(
+            "SELECT jobs.job_id, priority, status, created_at, COUNT(file_path) AS total_count, "
+            "COALESCE(SUM(state IN ('done', 'skipped')), 0) AS processed_count, COALESCE(SUM(state = 'failed'), 0) AS failed_count "
+            "FROM jobs LEFT JOIN job_files ON job_files.job_id = jobs.job_id "
+            "GROUP BY jobs.job_id ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def _owned_by_live_process(self, owner: str) -> bool:
+        if owner == self.owner:
+            return True
+        pid = int(owner.split(":", 1)[0])
+        # Another instance with our own pid can only be a previous incarnation
+        return pid != os.getpid() and _process_alive(pid)
+
+    def claim_interrupted(self) -> List[Dict[str, Any]]:
+        """
+        Take over unfinished jobs whose owning process has exited.
+
+        The owner is swapped with a compare-and-set, so when several worker
+        processes start together each interrupted job is claimed once.
+
+        Returns:
+            The claimed jobs with their params and the files still to process
+        """
+        claimed = []
+        placeholders = ", ".join("?" for _ in UNFINISHED_JOB_STATES)
+        for job in self._query(f"SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at", UNFINISHED_JOB_STATES):
+            if job["owner"] and self._owned_by_live_process(job["owner"]):
+                continue
+            cursor = self._execute(
+                "UPDATE jobs SET owner = ? WHERE job_id = ? AND owner IS ?",
+                (self.owner, job["job_id"], job["owner"])
+            )
+            if cursor.rowcount != 1:
+                continue
+            # Files caught mid-flight start over; finished ones are kept
+            self._execute(
+                "UPDATE job_files SET state = 'queued' WHERE job_id = ? AND state IN ('extracting', 'embedding')",
+                (job["job_id"],)
+            )
+            pending = self._query(
+                "SELECT file_path FROM job_files WHERE job_id = ? AND state = 'queued' ORDER BY position",
+                (job["job_id"],)
+            )
+            claimed.append({
+                "job_id": job["job_id"],
+                "priority": job["priority"],
+                "status": job["status"],
+                "params": json.loads(job["params"]),
+                "pending_files": [row["file_path"] for row in pending]
+            })
+        return claimed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,249 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words, numbers and dotted/hyphenated terms such as clause numbers ("4.2.1") or "co2-e"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+# The operation log is folded into the pickle once it outgrows it (and at least this size)
+MIN_CHECKPOINT_LOG_BYTES = 64 * 1024 * 1024
+
+# Very common words carry no signal and have the longest postings lists
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i if in is it its may must of on or
+our shall should that the their there these this to was we what when where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case text and split it into index terms."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        Incrementally updated inverted index with BM25 scoring.
+
+        Queries only touch the postings of their own terms, so a lookup does
+        not scan the collection. Every add and remove is appended to an
+        operation log ("chunk_id term:count ..." and "-chunk_id" lines), so
+        persisting a write costs as much as the write itself. The log is
+        replayed over the last pickled checkpoint on startup, and folded into
+        a new checkpoint by checkpoint() once it has grown as large as the
+        pickle. A checkpoint rotates the log and copies the index under the
+        lock, then pickles the copy without it, so searches and writes only
+        wait for the copy.
+
+        Args:
+            index_path: Pickle file the index checkpoint is written to
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.index_path = index_path
+        self.log_path = f"{os.path.splitext(index_path)[0]}.log"
+        # Log being folded into a checkpoint; replayed first if a crash left it behind
+        self.rotated_log_path = f"{self.log_path}.1"
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._checkpoint_lock = threading.Lock()
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.chunk_terms: Dict[str, List[str]] = {}
+        self.chunk_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._load()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "rb") as f:
+                    data = pickle.load(f)
+                self.postings = data["postings"]
+                self.chunk_terms = data["chunk_terms"]
+                self.chunk_lengths = data["chunk_lengths"]
+                self.total_length = sum(self.chunk_lengths.values())
+            except Exception as e:
+                logger.error(f"Error loading keyword index {self.index_path}: {str(e)}")
+        self._replay()
+        if len(self):
+            logger.info(f"Loaded keyword index with {len(self)} chunks")
+
+    def _replay(self):
+        # Replaying operations already in the checkpoint is harmless: the last
+        # operation on each chunk wins either way
+        if os.path.exists(self.rotated_log_path):
+            self._replay_log(self.rotated_log_path)
+        if os.path.exists(self.log_path):
+            self._replay_log(self.log_path)
+
+    def _replay_log(self, log_path: str):
+        complete = 0
+        with open(log_path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # torn final line from a crash
+                complete += len(raw)
+                parts = raw.decode("utf-8").split()
+                if not parts:
+                    continue
+                if parts[0].startswith("-"):
+                    self._remove([parts[0][1:]])
+                else:
+                    terms = {term: int(count) for term, count in (part.rsplit(":", 1) for part in parts[1:])}
+                    self._add(parts[0], terms)
+        if complete < os.path.getsize(log_path):
+            # Drop the torn line so new operations don't get glued onto it
+            os.truncate(log_path, complete)
+
+    @property
+    def log_bytes(self) -> int:
+        """Size of the operations logged since the last checkpoint."""
+        return sum(os.path.getsize(path) for path in (self.log_path, self.rotated_log_path) if os.path.exists(path))
+
+    def checkpoint(self, force: bool = True):
+        """
+        Pickle the whole index and drop the operation log.
+
+        Only rotating the log and copying the index's dictionaries happen
+        under the lock; the pickle is written without it. Callers still run
+        this outside the store's write lock, e.g. when the writer is idle.
+
+        Args:
+            force: Write a checkpoint even if the log is still small
+        """
+        with self._checkpoint_lock:
+            with self._lock:
+                log_bytes = self.log_bytes
+                if not log_bytes:
+                    return
+                checkpoint_bytes = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+                if not force and log_bytes < max(MIN_CHECKPOINT_LOG_BYTES, checkpoint_bytes):
+                    return
+                # Later operations go to a fresh log; the rotated one is covered by the copy
+                self._log.close()
+                if not os.path.exists(self.rotated_log_path):
+                    os.replace(self.log_path, self.rotated_log_path)
+                else:
+                    # A previous checkpoint failed after rotating; keep both logs' operations
+                    with open(self.log_path, "rb") as src, open(self.rotated_log_path, "ab") as dst:
+                        dst.write(src.read())
+                    os.remove(self.log_path)
+                self._log = open(self.log_path, "w", encoding="utf-8")
+                # Posting dicts are updated in place, so copy them; chunk_terms values are replaced, never mutated
+                snapshot = {
+                    "postings": {term: dict(postings) for term, postings in self.postings.items()},
+                    "chunk_terms": dict(self.chunk_terms),
+                    "chunk_lengths": dict(self.chunk_lengths)
+                }
+                chunks = len(self)
+
+            # Write to a temporary file and rename so a crash never leaves a partial index
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+            os.remove(self.rotated_log_path)
+        logger.info(f"Checkpointed keyword index ({chunks} chunks, {log_bytes} log bytes folded in)")
+
+    def _add(self, chunk_id: str, terms: Dict[str, int]):
+        self._remove([chunk_id])
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+        length = sum(terms.values())
+        self.chunk_terms[chunk_id] = list(terms)
+        self.chunk_lengths[chunk_id] = length
+        self.total_length += length
+
+    def add(self, chunk_ids: List[str], texts: List[str]):
+        """Index chunks, replacing any existing entries with the same IDs."""
+        lines = []
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                terms = Counter(tokenize(text))
+                self._add(chunk_id, terms)
+                lines.append(" ".join([chunk_id, *(f"{term}:{count}" for term, count in terms.items())]) + "\n")
+            self._log.write("".join(lines))
+            self._log.flush()
+
+    def remove(self, chunk_ids: Iterable[str]):
+        """Drop chunks from the index."""
+        with self._lock:
+            removed = [chunk_id for chunk_id in chunk_ids if chunk_id in self.chunk_lengths]
+            if removed:
+                self._remove(removed)
+                self._log.write("".join(f"-{chunk_id}\n" for chunk_id in removed))
+                self._log.flush()
+
+    def remove_document(self, doc_id: str):
+        """Drop every chunk of a document (chunk IDs are f"{doc_id}_{i}")."""
+        prefix = f"{doc_id}_"
+        with self._lock:
+            self.remove([chunk_id for chunk_id in self.chunk_lengths if chunk_id.startswith(prefix)])
+
+    def _remove(self, chunk_ids: Iterable[str]) -> bool:
+        removed = False
+        for chunk_id in chunk_ids:
+            terms = self.chunk_terms.pop(chunk_id, None)
+            if terms is None:
+                continue
+            for term in terms:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.chunk_lengths.pop(chunk_id, 0)
+            removed = True
+        return removed
+
+    def search(self, query_text: str, n_results: int = 5, allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Rank chunks against a query with BM25.
+
+        Args:
+            query_text: The search query text
+            n_results: Number of results to return
+            allowed_ids: If given, only these chunks are scored
+
+        Returns:
+            Up to n_results (chunk_id, score) pairs, highest score first
+        """
+        with self._lock:
+            n_chunks = len(self.chunk_lengths)
+            if not n_chunks:
+                return []
+            avg_length = self.total_length / n_chunks
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query_text)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log((n_chunks - len(postings) + 0.5) / (len(postings) + 0.5) + 1)
+                for chunk_id, tf in postings.items():
+                    if allowed_ids is not None and chunk_id not in allowed_ids:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def close(self):
+        with self._lock:
+            self._log.close()
@@ -1,17 +1,33 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 import os
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Literal
+import asyncio
+import hashlib
 import json
 import glob
 import logging
+import time
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pydantic import BaseModel
 
 # Import our modules
-from pdf_processor import extract_text_from_pdf, extract_metadata_from_pdf, chunk_text
-from embedding_store import EmbeddingStore
+from pdf_processor import stream_pdf
+from embedding_store import make_filters
+from manifest import compute_file_hash, source_key, HASH_BLOCK_SIZE
+from inference_pool import InferencePool, QueueFullError
+from micro_batcher import QueryBatcher
+from fusion import reciprocal_rank_fusion
+from snapshot import export_snapshot, import_snapshot, SnapshotError
+from model_registry import set_inference_threads, loaded_models
+from shards import ShardRegistry, DEFAULT_SHARD, merge_top_k
+from scheduler import IngestScheduler, IngestThrottle, JobCancelled, JobControl
+from job_store import JobStore
+from watcher import FolderWatcher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -31,90 +47,641 @@ app.add_middleware(
 
 # Global variables
 UPLOAD_DIR = "pdfs"
-CHUNK_SIZE = 1000  # characters
-CHUNK_OVERLAP = 200  # characters
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_INFERENCE_MODE = os.getenv("EMBEDDING_INFERENCE_MODE", "fp32")  # "fp32" or "int8" (dynamic quantization, CPU)
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", 0))  # PyTorch threads per forward pass; 0 = its default
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 0))  # 0 = the model's max sequence length
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))  # tokens
+EXTRACT_BATCH_CHUNKS = int(os.getenv("EXTRACT_BATCH_CHUNKS", 64))  # chunks handed from extraction to the writer at a time
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))  # extraction processes
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 512))  # chunks per bulk write
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", 64))  # texts per model forward pass
+WRITE_MAX_WAIT_SECONDS = float(os.getenv("WRITE_MAX_WAIT_SECONDS", 1.0))  # max buffering delay
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", min(4, os.cpu_count() or 1)))  # search threads
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", 64))  # searches allowed to wait
+UPLOAD_THREADS = int(os.getenv("UPLOAD_THREADS", 2))  # upload processing threads
+UPLOAD_MAX_QUEUE = int(os.getenv("UPLOAD_MAX_QUEUE", 8))  # uploads allowed to wait
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 256 * 1024 * 1024))  # largest accepted upload
+INGEST_SLOTS_INTERACTIVE = int(os.getenv("INGEST_SLOTS_INTERACTIVE", 2))  # concurrent upload jobs
+INGEST_SLOTS_BULK = int(os.getenv("INGEST_SLOTS_BULK", 1))  # concurrent /setup jobs
+INGEST_SLOTS_REINDEX = int(os.getenv("INGEST_SLOTS_REINDEX", 1))  # concurrent document replacement jobs
+INGEST_CPU_BUDGET = int(os.getenv("INGEST_CPU_BUDGET", max(1, (os.cpu_count() or 1) - INFERENCE_THREADS)))  # most extraction processes per bulk job
+INGEST_MODEL_SHARE = float(os.getenv("INGEST_MODEL_SHARE", 0.5))  # max share of model time for ingestion while searches run
+INGEST_IDLE_SECONDS = float(os.getenv("INGEST_IDLE_SECONDS", 2.0))  # search-free time after which ingestion runs unthrottled
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", 32))  # queries per micro-batch
+SEARCH_BATCH_MAX_WAIT_MS = float(os.getenv("SEARCH_BATCH_MAX_WAIT_MS", 5))  # max wait to fill a batch
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 1000))  # queries per /search/batch request
+MAX_CHUNK_IDS = int(os.getenv("MAX_CHUNK_IDS", 1000))  # chunk IDs per /chunks request
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 2))  # candidates per side = factor * n_results
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 4096))  # cached query embeddings
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))  # cached search results
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" (HNSW) or "flat" (exact scan)
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float16")  # flat backend storage: "float16" or "int8"
+HNSW_M = os.getenv("HNSW_M")  # graph degree for new collections (default: tuned, else 16)
+HNSW_CONSTRUCTION_EF = os.getenv("HNSW_CONSTRUCTION_EF")  # build-time candidate list (default: tuned, else 100)
+HNSW_SEARCH_EF = os.getenv("HNSW_SEARCH_EF")  # query-time candidate list (default: tuned, else 10)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")  # where index snapshots are written and received
+BOOTSTRAP_SNAPSHOT = os.getenv("BOOTSTRAP_SNAPSHOT")  # snapshot loaded at startup into an empty store
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", 300))  # how often churn is checked; 0 disables
+COMPACTION_MIN_RATIO = float(os.getenv("COMPACTION_MIN_RATIO", 0.2))  # deleted share of the index that triggers compaction
+COMPACTION_MIN_CHUNKS = int(os.getenv("COMPACTION_MIN_CHUNKS", 1000))  # fewest deleted chunks worth compacting
+SHARD_ROOT = os.getenv("SHARD_ROOT", "chroma_shards")  # one subdirectory per non-default shard
+SHARD_DIRECTORIES = json.loads(os.getenv("SHARD_DIRECTORIES", "{}"))  # {"shard": "/disk/path"} overrides
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")  # SQLite file holding job and per-file state
+WATCH_DIR = os.getenv("WATCH_DIR")  # folder indexed continuously as PDFs come and go (unset disables)
+WATCH_MODE = os.getenv("WATCH_MODE", "auto")  # "auto", "events" (inotify via watchdog) or "poll"
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", 2.0))  # quiet time before a changed file is indexed
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", 5.0))  # rescan interval when polling
+WATCH_SHARD = os.getenv("WATCH_SHARD", DEFAULT_SHARD)  # shard the watched folder is indexed into
 
-# Create upload directory if it doesn't exist
+# Allowance for multipart boundaries, part headers and form fields on top of the
+# file when checking Content-Length; the file itself is checked as it is read
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Create upload and snapshot directories if they don't exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+# Fix PyTorch's thread pool before the model is loaded
+set_inference_threads(INFERENCE_INTRA_OP_THREADS)
+
+# Paces ingestion encodes so searches keep their share of the model
+ingest_throttle = IngestThrottle(INGEST_MODEL_SHARE, INGEST_IDLE_SECONDS)
+
+# Options for every shard's embedding store
+STORE_OPTIONS = dict(
+    model_name=EMBEDDING_MODEL,
+    write_batch_size=WRITE_BATCH_SIZE,
+    encode_batch_size=ENCODE_BATCH_SIZE,
+    write_max_wait_seconds=WRITE_MAX_WAIT_SECONDS,
+    query_cache_size=QUERY_CACHE_SIZE,
+    result_cache_size=RESULT_CACHE_SIZE,
+    vector_backend=VECTOR_BACKEND,
+    flat_index_dtype=FLAT_INDEX_DTYPE,
+    hnsw_params={
+        "hnsw:M": int(HNSW_M) if HNSW_M else None,
+        "hnsw:construction_ef": int(HNSW_CONSTRUCTION_EF) if HNSW_CONSTRUCTION_EF else None,
+        "hnsw:search_ef": int(HNSW_SEARCH_EF) if HNSW_SEARCH_EF else None
+    },
+    ingest_throttle=ingest_throttle,
+    inference_mode=EMBEDDING_INFERENCE_MODE
+)
+
+# Shards, the default store and the query batcher are opened in the background
+# after the port is bound (see initialize); until then requests get a 503
+shard_registry: Optional[ShardRegistry] = None
+
+# The original "esg_documents" collection, used when a request names no shard
+embedding_store = None
+
+# Bounded executors keep model and index calls off the event loop
+inference_pool = InferencePool("inference", INFERENCE_THREADS, INFERENCE_MAX_QUEUE)
+upload_pool = InferencePool("upload", UPLOAD_THREADS, UPLOAD_MAX_QUEUE)
+
+# Concurrent searches are encoded and queried together in micro-batches
+query_batcher: Optional[QueryBatcher] = None
+
+# Startup progress reported by /ready
+readiness = {"state": "starting", "error": None, "started_at": time.time(), "ready_at": None, "timings": {}}
+
+# Paths served while the service is still warming up
+PROBE_PATHS = {"/", "/live", "/ready", "/health"}
+
+# Durable job and per-file processing status, shared by every worker process
+job_store = JobStore(JOB_STORE_PATH)
 
-# Initialize embedding store
-embedding_store = EmbeddingStore()
+# Optional watch folder, created on startup
+folder_watcher: Optional[FolderWatcher] = None
 
-# Global storage for processing status
-processing_status = {}
+# Ingestion jobs run by priority class, each within its own thread budget
+scheduler = IngestScheduler(
+    {"interactive": INGEST_SLOTS_INTERACTIVE, "bulk": INGEST_SLOTS_BULK, "reindex": INGEST_SLOTS_REINDEX},
+    on_state=job_store.set_status
+)
+
+# Background initialization and compaction tasks, started with the app
+initialization_task: Optional[asyncio.Task] = None
+compaction_task: Optional[asyncio.Task] = None
 
 # Pydantic models for request/response
 class SetupRequest(BaseModel):
     pdf_directory: Optional[str] = "pdfs"
+    workers: Optional[int] = None
+    tags: Optional[Dict[str, Any]] = None
+    shard: Optional[str] = None
 
 class SearchRequest(BaseModel):
     query: str
     n_results: Optional[int] = 5
+    mode: Optional[Literal["vector", "keyword", "hybrid"]] = "vector"
+    where: Optional[Dict[str, Any]] = None
+    where_document: Optional[Dict[str, Any]] = None
+    shards: Optional[List[str]] = None
+    fields: Optional[List[Literal["chunk_id", "text", "metadata", "score", "scores", "ranks", "shard"]]] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchRequest]
 
 class ProcessingStatusResponse(BaseModel):
     job_id: str
     status: str
+    priority: Optional[str] = None
     processed_count: int
     total_count: int
+    skipped_count: int = 0
     failed_files: List[str]
+    documents: List[Dict[str, Any]] = []
+    file_states: Dict[str, int] = {}
+    throughput: Optional[Dict[str, float]] = None
+    stages: Optional[Dict[str, Any]] = None
+
+def chunk_max_tokens() -> int:
+    """Token budget per chunk, driven by the embedding model unless configured."""
+    return CHUNK_MAX_TOKENS or embedding_store.sentence_transformer.max_seq_length
+
+@app.on_event("startup")
+async def startup():
+    # Return at once so uvicorn binds the port; /live answers while we warm up
+    global initialization_task
+    initialization_task = asyncio.create_task(initialize())
+
+def open_stores():
+    """Open every shard, then load the model and index with a dummy query."""
+    global shard_registry, embedding_store
+    started = time.perf_counter()
+    shard_registry = ShardRegistry(STORE_OPTIONS, shard_root=SHARD_ROOT, shard_directories=SHARD_DIRECTORIES)
+    embedding_store = shard_registry.default
+    opened = time.perf_counter()
+    readiness["timings"]["open_stores_seconds"] = opened - started
+    
+    # The first encode pays for loading weights and allocating buffers, and
+    # the first lookup for loading the index; pay both before taking traffic
+    embedding_store.encode(["warm-up"])
+    encoded = time.perf_counter()
+    readiness["timings"]["model_warmup_seconds"] = encoded - opened
+    for _, store in shard_registry.items():
+        if store.collection.count() > 0:
+            store.collection.query(query_embeddings=store.encode(["warm-up"]), n_results=1)
+    readiness["timings"]["index_warmup_seconds"] = time.perf_counter() - encoded
+
+async def initialize():
+    """Open stores and warm up in the background, then start the background work and mark the service ready."""
+    global query_batcher, folder_watcher, compaction_task
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, open_stores)
+        
+        query_batcher = QueryBatcher(embedding_store, inference_pool, SEARCH_BATCH_MAX_SIZE, SEARCH_BATCH_MAX_WAIT_MS)
+        await query_batcher.start()
+        
+        # A fresh replica loads a peer's snapshot instead of re-embedding every PDF
+        if BOOTSTRAP_SNAPSHOT and embedding_store.collection.count() == 0:
+            info = await upload_pool.run(import_snapshot, embedding_store, BOOTSTRAP_SNAPSHOT)
+            logger.info(f"Bootstrapped {info['loaded']} chunks from {BOOTSTRAP_SNAPSHOT}")
+        
+        resume_interrupted_jobs()
+        if WATCH_DIR:
+            await asyncio.get_running_loop().run_in_executor(None, reconcile_watch_dir)
+            folder_watcher = FolderWatcher(WATCH_DIR, index_folder_changes, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_SECONDS, WATCH_MODE)
+            folder_watcher.start()
+        if COMPACTION_INTERVAL_SECONDS > 0:
+            compaction_task = asyncio.create_task(compact_periodically())
+    except Exception as e:
+        logger.error(f"Document service failed to start: {str(e)}")
+        readiness["state"] = "failed"
+        readiness["error"] = str(e)
+        return
+    
+    readiness["state"] = "ready"
+    readiness["ready_at"] = time.time()
+    logger.info(f"Document service ready in {readiness['ready_at'] - readiness['started_at']:.1f}s")
+
+@app.on_event("shutdown")
+async def shutdown():
+    if initialization_task:
+        initialization_task.cancel()
+    if compaction_task:
+        compaction_task.cancel()
+    if folder_watcher:
+        folder_watcher.stop()
+    if query_batcher:
+        await query_batcher.stop()
+    inference_pool.shutdown()
+    upload_pool.shutdown()
+    scheduler.shutdown()
+    if shard_registry:
+        for _, store in shard_registry.items():
+            store.writer.close()
+
+@app.middleware("http")
+async def require_ready(request: Request, call_next):
+    """Answer everything but the probes with a retryable 503 until the service is warm."""
+    if readiness["state"] != "ready" and request.url.path not in PROBE_PATHS:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Document service is {readiness['state']}"},
+            headers={"Retry-After": "5"}
+        )
+    return await call_next(request)
+
+async def compact_periodically():
+    """Compact the vector index in the background once enough chunks are deleted."""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+        for name, store in shard_registry.items():
+            if not store.compaction_due(COMPACTION_MIN_RATIO, COMPACTION_MIN_CHUNKS):
+                continue
+            try:
+                await upload_pool.run(store.compact)
+            except QueueFullError:
+                logger.info(f"Upload pool busy; compaction of shard {name} deferred")
+            except Exception as e:
+                logger.error(f"Error compacting shard {name}: {str(e)}")
+
+def ingest_store(shard: Optional[str]):
+    """The store a document is ingested into, creating the shard if it is new."""
+    try:
+        return shard_registry.get_or_create(shard)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def existing_store(shard: Optional[str]):
+    """The store of an existing shard (the default shard if none is named)."""
+    try:
+        return shard_registry.get(shard)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Shard {shard} not found")
+
+def search_stores(shards: Optional[List[str]]):
+    """The (name, store) pairs a search fans out to: every shard unless some are named."""
+    try:
+        return shard_registry.select(shards)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Shard {e.args[0]} not found")
+
+def project(results: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Keep only the requested fields of each result (all of them if fields is None)."""
+    if fields is None:
+        return results
+    return [{field: result[field] for field in fields if field in result} for result in results]
+
+def pool_overloaded(error: QueueFullError) -> HTTPException:
+    """Turn a saturated pool into a retryable 503."""
+    logger.warning(str(error))
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
 
 @app.get("/")
 def read_root():
     return {"status": "Document Service is running"}
 
+@app.get("/live")
+def liveness_check():
+    """
+    Liveness probe: the process is up and serving HTTP, warm or not.
+    
+    Startup does not retry, so once it has failed the process can only be
+    fixed by a restart; 503 then makes the orchestrator restart it.
+    """
+    if readiness["state"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed", "error": readiness["error"]})
+    return {"status": "alive"}
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 once the model and index are warm, 503 before (or if startup failed)."""
+    body = {"status": readiness["state"], **{key: value for key, value in readiness.items() if key != "state"}}
+    if readiness["state"] != "ready":
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.get("/health")
 def health_check():
+    """Healthy only once ready, so callers checking for a 200 skip warming replicas."""
+    if readiness["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": readiness["state"]})
     return {"status": "healthy"}
 
-def process_pdfs_task(job_id: str, pdf_directory: str):
-    """Background task to process all PDFs in a directory."""
+@app.get("/metrics")
+def get_metrics():
+    """Executor queue depths and writer counters."""
+    return {
+        "models": loaded_models(),
+        "inference_pool": inference_pool.get_stats(),
+        "upload_pool": upload_pool.get_stats(),
+        "query_batcher": query_batcher.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "watcher": folder_watcher.get_stats() if folder_watcher else None,
+        "ingest_throttle": ingest_throttle.get_stats(),
+        "shards": {
+            name: {
+                "writer": dict(store.writer.stats),
+                "caches": store.get_cache_stats(),
+                "vector_index": store.get_index_settings()
+            }
+            for name, store in shard_registry.items()
+        }
+    }
+
+def validate_tags(tags: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Check custom document tags are flat scalar values the index can filter on."""
+    tags = tags or {}
+    for key, value in tags.items():
+        if not isinstance(value, (str, int, float, bool)):
+            raise HTTPException(status_code=400, detail=f"Tag {key} must be a string, number or boolean")
+    return tags
+
+def submit_job(job_id: str, priority: str, pdf_files: List[str], params: Dict[str, Any], content_hashes: Optional[Dict[str, str]] = None, paused: bool = False):
+    """Queue a registered job's files on the scheduler (paused until resumed, with paused)."""
+    scheduler.submit(
+        job_id, priority, process_files_task, job_id, pdf_files,
+        params["workers"], params["tags"], params["shard"], content_hashes, params["replaces"],
+        params.get("include_deleted", False),
+        paused=paused
+    )
+
+def start_job(
+    priority: str,
+    pdf_files: List[str],
+    workers: int,
+    tags: Optional[Dict[str, Any]] = None,
+    shard: Optional[str] = None,
+    content_hashes: Optional[Dict[str, str]] = None,
+    replaces: Optional[str] = None,
+    include_deleted: bool = False
+) -> str:
+    """Register a processing job in the job store, so /status can report it before it starts, and queue it."""
+    job_id = str(uuid.uuid4())
+    params = {
+        "workers": workers,
+        "tags": tags,
+        "shard": shard or DEFAULT_SHARD,
+        "replaces": replaces,
+        "include_deleted": include_deleted
+    }
+    job_store.create(job_id, priority, pdf_files, params)
+    submit_job(job_id, priority, pdf_files, params, content_hashes)
+    return job_id
+
+def index_folder_changes(changed: List[str], removed: List[str]):
+    """
+    Apply a debounced batch of watch folder changes.
+    
+    Changed files become one bulk job (content already indexed is skipped),
+    and removed files are dropped from the index.
+    """
+    store = shard_registry.get_or_create(WATCH_SHARD)
+    for path in removed:
+        if store.remove_file(source_key(path)):
+            logger.info(f"Removed {path} from the index")
+    if changed:
+        job_id = start_job("bulk", changed, min(INGEST_WORKERS, INGEST_CPU_BUDGET), None, WATCH_SHARD)
+        logger.info(f"Queued job {job_id} for {len(changed)} changed files in {WATCH_DIR}")
+
+def in_watch_dir(file_name: str) -> bool:
+    """True if a manifest key (an absolute source path) lies in WATCH_DIR."""
+    return bool(WATCH_DIR) and os.path.isabs(file_name) and file_name.startswith(os.path.abspath(WATCH_DIR) + os.sep)
+
+def reconcile_watch_dir():
+    """
+    Drop watch folder files that were deleted while the service was down.
+    
+    The watcher only sees removals while it runs; files it reports at start
+    cover additions and changes. Only manifest keys inside WATCH_DIR are
+    considered, so uploads and snapshot imports are left alone.
+    """
+    store = shard_registry.get_or_create(WATCH_SHARD)
+    missing = [
+        file_name for file_name in store.manifest.file_names()
+        if in_watch_dir(file_name) and not os.path.exists(file_name)
+    ]
+    if missing:
+        logger.info(f"{len(missing)} files were removed from {WATCH_DIR} while the service was down")
+        index_folder_changes([], missing)
+
+def resume_interrupted_jobs():
+    """Requeue jobs a previous process left unfinished, from their first unfinished file."""
+    for job in job_store.claim_interrupted():
+        job_id = job["job_id"]
+        if not job["pending_files"]:
+            job_store.set_status(job_id, "completed")
+            continue
+        logger.info(f"Resuming job {job_id} with {len(job['pending_files'])} files left")
+        # A paused job is queued paused, so it cannot start before it is resumed
+        paused = job["status"] == "paused"
+        job_store.set_status(job_id, "paused" if paused else "queued")
+        submit_job(job_id, job["priority"], job["pending_files"], job["params"], paused=paused)
+
+def process_files_task(
+    job_id: str,
+    pdf_files: List[str],
+    workers: int = INGEST_WORKERS,
+    tags: Optional[Dict[str, Any]] = None,
+    shard: str = DEFAULT_SHARD,
+    content_hashes: Optional[Dict[str, str]] = None,
+    replaces: Optional[str] = None,
+    include_deleted: bool = False,
+    control: Optional[JobControl] = None
+):
+    """
+    Scheduled task to process a list of PDFs for a job.
+    
+    Extraction and chunking run in a process pool; each document's chunks
+    are handed over in batches of EXTRACT_BATCH_CHUNKS as they are made,
+    through a bounded queue, to the store's shared writer, which embeds and
+    stores chunks from many documents in large batches. No whole document is
+    ever held in memory or pickled at once. Each file's state and
+    stage timings are recorded in the job store as it moves along. Custom tags are added to
+    every document's metadata so searches can filter on them. A single file
+    (e.g. an upload) is processed on a worker thread instead, which saves
+    spawning a process. Hashes already computed (e.g. while streaming an
+    upload) are passed in content_hashes, keyed by path. With replaces, the
+    single file becomes the new version of that document. Files whose content
+    was deleted through the API are skipped unless include_deleted is set
+    (an explicit upload).
+    
+    The job checks its control between batches, so it can be paused, resumed
+    and cancelled by the scheduler.
+    """
+    store = shard_registry.get_or_create(shard)
+    content_hashes = content_hashes or {}
+    control = control or JobControl()
     try:
-        # Find all PDF files in the directory
-        pdf_files = glob.glob(f"{pdf_directory}/*.pdf")
+        job_store.set_status(job_id, "processing")
+        max_tokens = chunk_max_tokens()
         
-        # Initialize status
-        processing_status[job_id] = {
-            "status": "processing",
-            "processed_count": 0,
-            "total_count": len(pdf_files),
-            "failed_files": []
-        }
+        def on_indexed(pdf_path: str, result: Dict[str, Any], error: Optional[Exception]):
+            # Runs on whichever thread flushed the document's last chunk
+            if error is not None:
+                logger.error(f"Error storing {pdf_path}: {str(error)}")
+                job_store.update_file(job_id, pdf_path, "failed", error=str(error))
+                return
+            job_store.update_file(
+                job_id, pdf_path, "done",
+                doc_id=result["doc_id"],
+                chunk_count=result["chunk_count"],
+                embed_seconds=result.get("embed_seconds", 0.0),
+                write_seconds=result.get("write_seconds", 0.0)
+            )
         
-        # Process each PDF
-        for pdf_path in pdf_files:
-            try:
-                # Extract text and metadata
-                text = extract_text_from_pdf(pdf_path)
-                metadata = extract_metadata_from_pdf(pdf_path)
-                
-                # Generate a document ID
-                doc_id = str(uuid.uuid4())
-                
-                # Chunk the text
-                chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
-                
-                # Store in embedding database
-                embedding_store.add_document_chunks(doc_id, chunks, metadata)
-                
-                # Update status
-                processing_status[job_id]["processed_count"] += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing {pdf_path}: {str(e)}")
-                processing_status[job_id]["failed_files"].append(os.path.basename(pdf_path))
+        if workers > 1 and len(pdf_files) > 1:
+            # Spawn rather than fork so workers don't inherit the model and its threads
+            context = multiprocessing.get_context("spawn")
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            manager = context.Manager()
+            batches = manager.Queue(maxsize=workers * 4)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+            manager = None
+            batches = queue.Queue(maxsize=4)
+        
+        try:
+            with executor as pool:
+                futures = {}
+                try:
+                    for pdf_path in pdf_files:
+                        control.checkpoint()
+                        try:
+                            # Skip files whose content is already indexed, or was deleted
+                            content_hash = content_hashes.get(pdf_path) or compute_file_hash(pdf_path)
+                            file_key = source_key(pdf_path)
+                            if replaces:
+                                unchanged = content_hash == replaces
+                            else:
+                                unchanged = store.manifest.is_unchanged(file_key, content_hash) or (
+                                    not include_deleted and store.manifest.is_deleted(file_key, content_hash)
+                                )
+                            if unchanged:
+                                job_store.update_file(job_id, pdf_path, "skipped")
+                                continue
+                            
+                            # Identical content indexed under another file only costs the hash
+                            if not replaces:
+                                linked = store.link_file(file_key, content_hash)
+                                if linked is not None:
+                                    on_indexed(pdf_path, linked, None)
+                                    continue
+                            
+                            future = pool.submit(
+                                stream_pdf, pdf_path, batches, max_tokens, CHUNK_OVERLAP_TOKENS, EMBEDDING_MODEL, EXTRACT_BATCH_CHUNKS
+                            )
+                            futures[future] = (pdf_path, content_hash)
+                            job_store.update_file(job_id, pdf_path, "extracting")
+                        except Exception as e:
+                            logger.error(f"Error hashing {pdf_path}: {str(e)}")
+                            job_store.update_file(job_id, pdf_path, "failed", error=str(e))
+                    
+                    stream_to_writer(job_id, store, futures, batches, tags, replaces, on_indexed, control)
+                except Exception:
+                    # Drop extractions that have not started, and drain the queue so
+                    # running ones are not left blocked on it
+                    for future in futures:
+                        future.cancel()
+                    while not all(future.done() for future in futures):
+                        try:
+                            batches.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+                    raise
+        finally:
+            if manager is not None:
+                manager.shutdown()
+        
+        # Write whatever is still buffered for this job
+        store.writer.flush()
         
         # Update final status
-        processing_status[job_id]["status"] = "completed"
+        job_store.set_status(job_id, "completed")
         
+    except JobCancelled:
+        logger.info(f"Job {job_id} cancelled")
+        store.writer.flush()
+        job_store.set_status(job_id, "cancelled")
     except Exception as e:
         logger.error(f"Error in background processing task: {str(e)}")
-        processing_status[job_id]["status"] = "failed"
+        job_store.set_status(job_id, "failed")
 
-@app.post("/setup", response_model=dict)
-async def setup_document_service(
-    background_tasks: BackgroundTasks,
-    request: SetupRequest
+def stream_to_writer(
+    job_id: str,
+    store,
+    futures: Dict[Any, Any],
+    batches,
+    tags: Optional[Dict[str, Any]],
+    replaces: Optional[str],
+    on_indexed: Callable[[str, Dict[str, Any], Optional[Exception]], None],
+    control: JobControl
 ):
+    """
+    Feed the chunk batches extraction workers put on the queue to the store's writer.
+    
+    Each file's document is begun when its metadata arrives, fed batch by
+    batch, and ended when its extraction is done, or abandoned (with its
+    stored chunks deleted) when extraction fails halfway. Returns once every
+    submitted file has finished extracting.
+    """
+    content_hashes = {pdf_path: content_hash for pdf_path, content_hash in futures.values()}
+    # The document each file streams into; None once there is nothing (more) to send
+    doc_ids: Dict[str, Optional[str]] = {}
+    unfinished = set(content_hashes)
+    
+    try:
+        while unfinished:
+            control.checkpoint()
+            try:
+                kind, pdf_path, payload = batches.get(timeout=1.0)
+            except queue.Empty:
+                # A worker that died (e.g. killed for memory) never reports; fail its file
+                for future, (pdf_path, _) in futures.items():
+                    if pdf_path in unfinished and future.done() and future.exception() is not None:
+                        unfinished.discard(pdf_path)
+                        doc_id = doc_ids.pop(pdf_path, None)
+                        if doc_id is not None:
+                            store.end_document(doc_id, future.exception())
+                        else:
+                            job_store.update_file(job_id, pdf_path, "failed", error=str(future.exception()))
+                continue
+            
+            try:
+                if kind == "metadata":
+                    job_store.update_file(job_id, pdf_path, "embedding", page_count=payload["page_count"])
+                    metadata = {**(tags or {}), **payload}
+                    on_stored = lambda result, error, pdf_path=pdf_path: on_indexed(pdf_path, result, error)
+                    if replaces:
+                        doc_ids[pdf_path] = store.begin_replacement(replaces, content_hashes[pdf_path], metadata, on_indexed=on_stored)
+                    else:
+                        doc_ids[pdf_path] = store.begin_document(source_key(pdf_path), content_hashes[pdf_path], metadata, on_indexed=on_stored)
+                elif kind == "chunks":
+                    if doc_ids.get(pdf_path) is not None:
+                        store.add_chunks(doc_ids[pdf_path], *payload)
+                elif kind == "done":
+                    unfinished.discard(pdf_path)
+                    job_store.update_file(job_id, pdf_path, None, extract_seconds=payload["extract_seconds"], chunk_seconds=payload["chunk_seconds"])
+                    doc_id = doc_ids.pop(pdf_path, None)
+                    if doc_id is not None:
+                        store.end_document(doc_id)
+                else:
+                    unfinished.discard(pdf_path)
+                    began = pdf_path in doc_ids
+                    doc_id = doc_ids.pop(pdf_path, None)
+                    if doc_id is not None:
+                        store.end_document(doc_id, Exception(payload))
+                    elif not began:
+                        job_store.update_file(job_id, pdf_path, "failed", error=payload)
+            except Exception as e:
+                logger.error(f"Error processing {pdf_path}: {str(e)}")
+                doc_id = doc_ids.get(pdf_path)
+                doc_ids[pdf_path] = None
+                if doc_id is not None:
+                    store.end_document(doc_id, e)
+                else:
+                    job_store.update_file(job_id, pdf_path, "failed", error=str(e))
+    except Exception as e:
+        # Abandon documents still streaming; what they already stored is deleted
+        for doc_id in doc_ids.values():
+            if doc_id is not None:
+                store.end_document(doc_id, e)
+        raise
+
+@app.post("/setup", response_model=dict)
+async def setup_document_service(request: SetupRequest):
     """
     Set up the document service by processing all PDFs in the specified directory.
     Returns a job ID that can be used to check the processing status.
@@ -125,11 +692,18 @@ async def setup_document_service(
     if not os.path.exists(pdf_directory):
         raise HTTPException(status_code=404, detail=f"Directory {pdf_directory} not found")
     
-    # Generate a job ID
-    job_id = str(uuid.uuid4())
+    workers = request.workers or INGEST_WORKERS
+    if workers < 1:
+        raise HTTPException(status_code=400, detail="workers must be at least 1")
+    # Bulk jobs never take more processes than the ingestion CPU budget
+    workers = min(workers, INGEST_CPU_BUDGET)
+    tags = validate_tags(request.tags)
+    ingest_store(request.shard)
     
-    # Start processing in the background
-    background_tasks.add_task(process_pdfs_task, job_id, pdf_directory)
+    # Find all PDF files in the directory and register the job
+    pdf_files = glob.glob(f"{pdf_directory}/*.pdf")
+    # Queue as a bulk job so uploads are never stuck behind a whole corpus
+    job_id = start_job("bulk", pdf_files, workers, tags, request.shard)
     
     return {
         "job_id": job_id,
@@ -139,59 +713,467 @@ async def setup_document_service(
 
 @app.get("/status/{job_id}", response_model=ProcessingStatusResponse)
 async def get_processing_status(job_id: str):
-    """Get the status of a PDF processing job."""
-    if job_id not in processing_status:
+    """
+    Get the status of a PDF processing job.
+    
+    Besides counts, this reports how many files are in each state and the
+    seconds spent in each stage (extract, chunk, embed, write), naming the
+    bottleneck stage.
+    """
+    status_data = job_store.get(job_id)
+    if status_data is None:
         raise HTTPException(status_code=404, detail=f"Job ID {job_id} not found")
+    return status_data
+
+async def vector_search(stores: List[Any], query: str, n_results: int, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Search shards concurrently through the batcher and merge their top k by distance."""
+    ingest_throttle.note_search()
+    ranked = await asyncio.gather(*(query_batcher.search(query, n_results, filters, store) for _, store in stores))
+    return merge_top_k(dict(zip([name for name, _ in stores], ranked)), n_results)
+
+async def keyword_search_shards(stores: List[Any], query: str, n_results: int, where: Optional[Dict[str, Any]], where_document: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keyword-search shards concurrently and merge their top k by BM25 score.
     
-    status_data = processing_status[job_id]
-    return {
-        "job_id": job_id,
-        **status_data
-    }
+    Each shard scores with its own term statistics, so scores from shards of
+    very different sizes are only roughly comparable.
+    """
+    ingest_throttle.note_search()
+    ranked = await asyncio.gather(*(
+        inference_pool.run(store.keyword_search, query, n_results, where, where_document)
+        for _, store in stores
+    ))
+    return merge_top_k(dict(zip([name for name, _ in stores], ranked)), n_results, higher_is_better=True)
 
 @app.post("/search", response_model=List[Dict[str, Any]])
 async def search_documents(request: SearchRequest):
     """
     Search for documents relevant to the query.
     Returns a list of document chunks ordered by relevance.
+    
+    mode selects vector search (default, score is a distance), keyword search
+    (score is BM25) or hybrid search, which runs both concurrently and fuses
+    them with reciprocal rank fusion (score is the fused score, with each
+    side's own score under "scores").
+    
+    where/where_document filters (Chroma syntax, e.g. {"file_name": "..."} or
+    {"page_count": {"$gt": 50}}) are applied inside the index in every mode.
+    
+    shards limits the search to the named shards; by default every shard is
+    searched. Shards are searched concurrently and each result is tagged
+    with its shard.
+    
+    fields projects each result, e.g. ["chunk_id", "score", "metadata"] to
+    leave out the text and fetch it later from /chunks for the chunks used.
     """
     query = request.query
     n_results = request.n_results
+    stores = search_stores(request.shards)
+    
+    # Search for relevant documents; the batcher runs them on the inference pool
+    try:
+        filters = make_filters(request.where, request.where_document)
+        if request.mode == "keyword":
+            results = await keyword_search_shards(stores, query, n_results, request.where, request.where_document)
+        elif request.mode == "hybrid":
+            candidates = n_results * HYBRID_CANDIDATE_FACTOR
+            vector_results, keyword_results = await asyncio.gather(
+                vector_search(stores, query, candidates, filters),
+                keyword_search_shards(stores, query, candidates, request.where, request.where_document)
+            )
+            results = reciprocal_rank_fusion(
+                {"vector": vector_results, "keyword": keyword_results},
+                n_results
+            )
+        else:
+            results = await vector_search(stores, query, n_results, filters)
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    except ValueError as e:
+        # Chroma rejects malformed filters with ValueError
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    
+    return project(results, request.fields)
+
+@app.post("/keyword_search", response_model=List[Dict[str, Any]])
+async def keyword_search(request: SearchRequest):
+    """
+    Search for document chunks containing the query's terms.
+    Returns a list of document chunks ordered by BM25 score (higher is better).
+    """
+    stores = search_stores(request.shards)
+    try:
+        results = await keyword_search_shards(stores, request.query, request.n_results, request.where, request.where_document)
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
+    
+    return project(results, request.fields)
+
+@app.post("/search/batch", response_model=List[Dict[str, Any]])
+async def search_documents_batch(request: BatchSearchRequest):
+    """
+    Search for many queries in one request.
+    All queries are encoded in one pass and run as a single collection lookup.
+    Returns one entry per query, in input order; a query whose lookup failed
+    carries an error and no results, without failing the others.
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    if any(item.mode != "vector" for item in request.queries):
+        raise HTTPException(status_code=400, detail="Batch search only supports mode 'vector'")
+    
+    query_texts = [item.query for item in request.queries]
+    n_results = [item.n_results for item in request.queries]
+    
+    # Group the queries by shard; each shard runs its share as one batch
+    groups: Dict[str, Any] = {}
+    for i, item in enumerate(request.queries):
+        for name, store in search_stores(item.shards):
+            groups.setdefault(name, (store, []))[1].append(i)
+    
+    # Already batched, so this goes straight to the inference pool; every
+    # query is encoded once and the embeddings are shared by its shards
+    ingest_throttle.note_search()
+    try:
+        filters = [make_filters(item.where, item.where_document) for item in request.queries]
+        embeddings = await inference_pool.run(embedding_store.encode_queries, query_texts)
+        shard_results = await asyncio.gather(*(
+            inference_pool.run(
+                store.search_batch,
+                [query_texts[i] for i in indexes],
+                [n_results[i] for i in indexes],
+                [filters[i] for i in indexes],
+                [embeddings[i] for i in indexes],
+                return_exceptions=True
+            )
+            for store, indexes in groups.values()
+        ))
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {str(e)}")
     
-    # Search for relevant documents
-    results = embedding_store.search_documents(query, n_results)
+    ranked: List[Dict[str, List[Dict[str, Any]]]] = [{} for _ in query_texts]
+    errors: Dict[int, str] = {}
+    for name, (_, indexes), results in zip(groups, groups.values(), shard_results):
+        for i, query_results in zip(indexes, results):
+            if isinstance(query_results, Exception):
+                errors[i] = f"Search failed on shard {name}: {str(query_results)}"
+            else:
+                ranked[i][name] = query_results
     
-    return results
+    return [
+        {"query": query, "results": [], "error": errors[i]} if i in errors else
+        {"query": query, "results": project(merge_top_k(ranked[i], n_results[i]), request.queries[i].fields)}
+        for i, query in enumerate(query_texts)
+    ]
+
+@app.get("/chunks", response_model=List[Dict[str, Any]])
+def get_chunks(ids: List[str] = Query(...), shard: Optional[str] = None):
+    """
+    Fetch chunk texts by ID, e.g. after a search made with fields that left text out.
+    
+    Texts come from each shard's compressed chunk store, not the vector index.
+    Without a shard every shard is looked in. Returns one entry per ID, in
+    request order, with text null for unknown IDs.
+    """
+    if len(ids) > MAX_CHUNK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CHUNK_IDS} chunk IDs per request")
+    
+    found: Dict[str, Dict[str, Any]] = {}
+    for name, store in search_stores([shard] if shard else None):
+        missing = [chunk_id for chunk_id in ids if chunk_id not in found]
+        if not missing:
+            break
+        for chunk_id, text in store.get_chunk_texts(missing).items():
+            found[chunk_id] = {"text": text, "shard": name}
+    
+    return [
+        {"chunk_id": chunk_id, "text": found.get(chunk_id, {}).get("text"), "shard": found.get(chunk_id, {}).get("shard")}
+        for chunk_id in ids
+    ]
+
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """
+    Stream an upload to disk in fixed-size blocks, hashing it on the way.
+    
+    The file is written under a temporary name and renamed once complete, so
+    a partial upload never replaces a previous version.
+    
+    Returns:
+        The SHA-256 content hash
+    
+    Raises:
+        HTTPException: 413 if the upload exceeds MAX_UPLOAD_BYTES
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while block := await file.read(HASH_BLOCK_SIZE):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+                digest.update(block)
+                buffer.write(block)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return digest.hexdigest()
+
+def check_upload_size(request: Request):
+    """Reject an upload whose declared size is already over the limit, before reading it."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
 
 @app.post("/upload")
 async def upload_file(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
+    tags: Optional[str] = Form(None),
+    shard: Optional[str] = Form(None),
 ):
-    """Upload a single PDF file."""
+    """
+    Upload a single PDF file, optionally with custom tags as a JSON object and a target shard.
+    
+    The file is streamed to disk and queued as a processing job; the response
+    returns at once with a job ID to follow on /status/{job_id}, whose
+    documents list carries the doc_id once the file is indexed.
+    """
+    check_upload_size(request)
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
+    try:
+        parsed_tags = validate_tags(json.loads(tags) if tags else None)
+    except (json.JSONDecodeError, AttributeError):
+        raise HTTPException(status_code=400, detail="tags must be a JSON object")
+    ingest_store(shard)
+    
     # Save the uploaded file
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(await file.read())
+    file_name = os.path.basename(file.filename)
+    file_path = os.path.join(UPLOAD_DIR, file_name)
+    content_hash = await save_upload(file, file_path)
+    
+    # Parsing and embedding run as an interactive job, ahead of bulk and re-index work
+    job_id = start_job("interactive", [file_path], 1, parsed_tags, shard, {file_path: content_hash}, include_deleted=True)
     
+    return {
+        "job_id": job_id,
+        "message": f"File {file_name} uploaded and queued for processing",
+        "content_hash": content_hash,
+        "status_endpoint": f"/status/{job_id}"
+    }
+
+@app.get("/documents", response_model=List[Dict[str, Any]])
+def list_documents(shard: Optional[str] = None):
+    """List indexed documents with their file names, chunk counts and indexing time (every shard unless one is named)."""
+    documents = [
+        {**entry, "shard": name}
+        for name, store in search_stores([shard] if shard else None)
+        for entry in store.manifest.list_documents()
+    ]
+    return sorted(documents, key=lambda entry: entry["indexed_at"])
+
+@app.get("/documents/{doc_id}", response_model=Dict[str, Any])
+def get_document(doc_id: str, shard: Optional[str] = None):
+    """Get one indexed document's registry entry."""
+    store = existing_store(shard)
+    entry = store.manifest.get_document(doc_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    return {**entry, "content_hash": doc_id, "file_names": store.manifest.files_for(doc_id)}
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, shard: Optional[str] = None):
+    """
+    Remove a document's chunks from the index, along with every file name pointing at it.
+    
+    The file names keep a tombstone, so /setup and the watch folder skip the
+    same content from then on; uploading it again indexes it again.
+    """
+    store = existing_store(shard)
     try:
-        # Process the file
-        text = extract_text_from_pdf(file_path)
-        metadata = extract_metadata_from_pdf(file_path)
-        doc_id = str(uuid.uuid4())
-        chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
-        embedding_store.add_document_chunks(doc_id, chunks, metadata)
-        
-        return {
-            "message": f"File {file.filename} uploaded and processed successfully",
-            "doc_id": doc_id,
-            "chunk_count": len(chunks)
-        }
+        entry = await upload_pool.run(store.remove_document, doc_id)
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    return {"message": f"Document {doc_id} deleted", "doc_id": doc_id, "chunk_count": entry["chunk_count"]}
+
+@app.put("/documents/{doc_id}")
+async def replace_document(
+    request: Request,
+    doc_id: str,
+    file: UploadFile = File(...),
+    tags: Optional[str] = Form(None),
+    shard: Optional[str] = Form(None),
+):
+    """
+    Replace a document with a new PDF version.
+    
+    Every file name that pointed at the document moves to the new content,
+    which gets a new doc_id (IDs are content hashes). The old version stays
+    searchable until the new chunks are stored. The work runs as a re-index
+    job; /status/{job_id} reports the new doc_id once it is indexed.
+    """
+    check_upload_size(request)
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    store = existing_store(shard)
+    file_names = store.manifest.files_for(doc_id)
+    if not file_names:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    
+    try:
+        parsed_tags = validate_tags(json.loads(tags) if tags else None)
+    except (json.JSONDecodeError, AttributeError):
+        raise HTTPException(status_code=400, detail="tags must be a JSON object")
+    
+    # The watched folder is the source of truth for its documents; a new
+    # version written there would be indexed again by the watcher
+    if any(in_watch_dir(file_name) for file_name in file_names):
+        raise HTTPException(status_code=409, detail=f"Document {doc_id} comes from the watched folder; replace the file in {WATCH_DIR} instead")
+    
+    # The new version is written back where the document came from: manifest
+    # keys are absolute source paths (an upload or a /setup folder), while
+    # entries from before that are bare names of files in UPLOAD_DIR
+    origin = file_names[0]
+    file_path = origin if os.path.isabs(origin) else os.path.join(UPLOAD_DIR, origin)
+    content_hash = await save_upload(file, file_path)
+    
+    job_id = start_job("reindex", [file_path], 1, parsed_tags, shard, {file_path: content_hash}, replaces=doc_id)
+    
+    return {
+        "job_id": job_id,
+        "message": f"Replacement of document {doc_id} queued for processing",
+        "previous_doc_id": doc_id,
+        "content_hash": content_hash,
+        "status_endpoint": f"/status/{job_id}"
+    }
+
+@app.get("/jobs", response_model=Dict[str, Any])
+async def list_jobs(limit: int = Query(100, ge=1, le=1000)):
+    """List recent processing jobs with their priority class and status, plus the scheduler's queues."""
+    return {"jobs": job_store.list_jobs(limit), "scheduler": scheduler.get_stats()}
+
+@app.get("/jobs/{job_id}/files", response_model=List[Dict[str, Any]])
+async def list_job_files(job_id: str):
+    """Every file of a job with its state, doc_id, error and per-stage timings."""
+    if not job_store.exists(job_id):
+        raise HTTPException(status_code=404, detail=f"Job ID {job_id} not found")
+    return job_store.get_files(job_id)
+
+@app.post("/jobs/{job_id}/{action}")
+async def control_job(job_id: str, action: str):
+    """Pause, resume or cancel a queued or running job (action is pause, resume or cancel)."""
+    actions = {"pause": scheduler.pause, "resume": scheduler.resume, "cancel": scheduler.cancel}
+    if action not in actions:
+        raise HTTPException(status_code=400, detail="action must be pause, resume or cancel")
+    if not job_store.exists(job_id):
+        raise HTTPException(status_code=404, detail=f"Job ID {job_id} not found")
+    if not actions[action](job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already {job_store.get_status(job_id)}")
+    return {"job_id": job_id, "status": job_store.get_status(job_id)}
+
+@app.post("/admin/compact")
+async def compact_index(shard: Optional[str] = None):
+    """Reclaim the space of deleted chunks in the vector index now (every shard unless one is named)."""
+    compacted = {}
+    for name, store in search_stores([shard] if shard else None):
+        try:
+            reclaimed = await upload_pool.run(store.compact)
+        except QueueFullError as e:
+            raise pool_overloaded(e)
+        compacted[name] = {"reclaimed_chunks": reclaimed, "index": store.get_index_settings()}
+    return compacted
+
+def snapshot_path(name: str) -> str:
+    """Path of a snapshot in SNAPSHOT_DIR, rejecting names that would escape it."""
+    if not name or os.path.basename(name) != name or not name.endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Snapshot name must be a .zip file name")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+@app.get("/admin/snapshot")
+def list_snapshots():
+    """List the snapshots available on this node."""
+    return [
+        {"name": name, "size_bytes": os.path.getsize(os.path.join(SNAPSHOT_DIR, name))}
+        for name in sorted(os.listdir(SNAPSHOT_DIR))
+        if name.endswith(".zip")
+    ]
+
+@app.post("/admin/snapshot/export")
+async def export_index_snapshot(shard: Optional[str] = None):
+    """Export a shard's chunk texts, metadata and embeddings to a checksummed snapshot archive."""
+    store = existing_store(shard)
+    name = f"snapshot-{shard or DEFAULT_SHARD}-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    try:
+        info = await upload_pool.run(export_snapshot, store, snapshot_path(name))
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    except Exception as e:
+        logger.error(f"Error exporting snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error exporting snapshot: {str(e)}")
+    return {"name": name, "shard": shard or DEFAULT_SHARD, "size_bytes": os.path.getsize(snapshot_path(name)), **info}
+
+@app.get("/admin/snapshot/{name}")
+def download_snapshot(name: str):
+    """Download a snapshot archive, e.g. to bootstrap another replica."""
+    path = snapshot_path(name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Snapshot {name} not found")
+    return FileResponse(path, media_type="application/zip", filename=name)
+
+@app.post("/admin/snapshot/import")
+async def import_index_snapshot(
+    file: Optional[UploadFile] = File(None),
+    name: Optional[str] = Form(None),
+    replace: bool = Form(False),
+    shard: Optional[str] = Form(None),
+):
+    """
+    Bulk-load a snapshot into a shard without re-embedding.
+    
+    Either upload the archive as `file` or give the `name` of one already in
+    SNAPSHOT_DIR. A non-empty shard is only overwritten with `replace`.
+    """
+    store = ingest_store(shard)
+    if file is not None:
+        name = os.path.basename(file.filename or "")
+        path = snapshot_path(name)
+        # Receive next to the target and rename, so a same-named snapshot is
+        # only replaced by a complete upload
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as buffer:
+                while block := await file.read(1024 * 1024):
+                    buffer.write(block)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    elif name:
+        path = snapshot_path(name)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"Snapshot {name} not found")
+    else:
+        raise HTTPException(status_code=400, detail="Provide a snapshot file or name")
+    
+    try:
+        info = await upload_pool.run(import_snapshot, store, path, replace)
+    except QueueFullError as e:
+        raise pool_overloaded(e)
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error processing uploaded file: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        logger.error(f"Error importing snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error importing snapshot: {str(e)}")
+    return {"name": name, "shard": shard or DEFAULT_SHARD, **info}
 
 # Run with: uvicorn main:app --reload
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024  # bytes read per hash update
+
+
+def compute_file_hash(file_path: str) -> str:
+    """Compute the SHA-256 content hash of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(file_path: str) -> str:
+    """
+    The manifest key of a source file: its absolute path.
+
+    Files with the same name in different folders (uploads, the watch folder,
+    /setup directories) are different files and must not replace each other.
+    """
+    return os.path.abspath(file_path)
+
+
+def _legacy_key(file_key: str) -> Optional[str]:
+    # Manifests used to be keyed by bare file name
+    name = os.path.basename(file_key)
+    return name if name != file_key else None
+
+
+class DocumentManifest:
+    def __init__(self, manifest_path: str):
+        """
+        Track which file contents are already indexed.
+
+        Documents are keyed by content hash, and each source file (keyed by
+        source_key, its absolute path; "file name" below) points at the hash
+        of the content it was last indexed with. Several files may share one
+        document when their contents are identical. Deleting a document
+        leaves a tombstone for each of its files, so a folder scan or the
+        watch folder does not index the same content again. Entries from
+        manifests keyed by bare file name move to the full key the first time
+        a file of that name is recorded or linked.
+
+        Args:
+            manifest_path: JSON file the manifest is persisted to
+        """
+        self.manifest_path = manifest_path
+        self._lock = threading.RLock()
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, str] = {}
+        self.deleted: Dict[str, str] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r") as f:
+                data = json.load(f)
+            self.documents = data.get("documents", {})
+            self.files = data.get("files", {})
+            self.deleted = data.get("deleted", {})
+        except Exception as e:
+            logger.error(f"Error loading manifest {self.manifest_path}: {str(e)}")
+
+    def _save(self):
+        # Write to a temporary file and rename so readers never see a partial manifest
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"documents": self.documents, "files": self.files, "deleted": self.deleted}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_unchanged(self, file_name: str, content_hash: str) -> bool:
+        """Return True if the file was last indexed with exactly this content."""
+        with self._lock:
+            return self.files.get(file_name) == content_hash and content_hash in self.documents
+
+    def is_deleted(self, file_name: str, content_hash: str) -> bool:
+        """Return True if this file's content was indexed and then deleted."""
+        with self._lock:
+            legacy = _legacy_key(file_name)
+            return self.deleted.get(file_name) == content_hash or (
+                legacy is not None and file_name not in self.deleted and self.deleted.get(legacy) == content_hash
+            )
+
+    def _take(self, file_name: str) -> Optional[str]:
+        # The hash a file points at, moving an entry under its legacy bare name to the full key
+        previous_hash = self.files.get(file_name)
+        legacy = _legacy_key(file_name)
+        if previous_hash is None and legacy is not None:
+            previous_hash = self.files.pop(legacy, None)
+        self.deleted.pop(file_name, None)
+        if legacy is not None:
+            self.deleted.pop(legacy, None)
+        return previous_hash
+
+    def get_document(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the manifest entry for a content hash, if indexed."""
+        with self._lock:
+            return self.documents.get(content_hash)
+
+    def get_file(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """Return the manifest entry for the content a file name currently points at."""
+        with self._lock:
+            content_hash = self.files.get(file_name)
+            return self.documents.get(content_hash) if content_hash else None
+
+    def record(self, file_name: str, content_hash: str, doc_id: str, chunk_count: int):
+        """
+        Point a file name at an indexed document and persist the manifest.
+
+        Returns:
+            The content hash the file name pointed at before, if any
+        """
+        with self._lock:
+            previous_hash = self._take(file_name)
+            self.documents[content_hash] = {
+                "doc_id": doc_id,
+                "file_name": file_name,
+                "chunk_count": chunk_count,
+                "indexed_at": datetime.utcnow().isoformat()
+            }
+            self.files[file_name] = content_hash
+            self._save()
+            return previous_hash if previous_hash != content_hash else None
+
+    def link(self, file_name: str, content_hash: str) -> Optional[str]:
+        """Point a file name at an already indexed document (identical content)."""
+        with self._lock:
+            previous_hash = self._take(file_name)
+            self.files[file_name] = content_hash
+            self._save()
+            return previous_hash if previous_hash != content_hash else None
+
+    def unlink(self, file_name: str) -> Optional[str]:
+        """
+        Forget a file name, and any tombstone it left, and persist.
+
+        Returns:
+            The content hash the file name pointed at, if any
+        """
+        with self._lock:
+            content_hash = self.files.pop(file_name, None)
+            tombstone = self.deleted.pop(file_name, None)
+            if content_hash is not None or tombstone is not None:
+                self._save()
+            return content_hash
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """Every indexed document with the file names that point at it."""
+        with self._lock:
+            names: Dict[str, List[str]] = {}
+            for file_name, content_hash in self.files.items():
+                names.setdefault(content_hash, []).append(file_name)
+            return [
+                {**entry, "content_hash": content_hash, "file_names": sorted(names.get(content_hash, []))}
+                for content_hash, entry in self.documents.items()
+            ]
+
+    def file_names(self) -> List[str]:
+        """Every file name that currently points at a document."""
+        with self._lock:
+            return sorted(self.files)
+
+    def files_for(self, content_hash: str) -> List[str]:
+        """File names that currently point at a document."""
+        with self._lock:
+            return sorted(file_name for file_name, target in self.files.items() if target == content_hash)
+
+    def remove(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Drop a document and every file name pointing at it, leaving a
+        tombstone per file name, and persist.
+
+        Returns:
+            The dropped entry, or None if the document is unknown
+        """
+        with self._lock:
+            entry = self.documents.pop(content_hash, None)
+            if entry is None:
+                return None
+            for file_name, target in self.files.items():
+                if target == content_hash:
+                    self.deleted[file_name] = content_hash
+            self.files = {file_name: target for file_name, target in self.files.items() if target != content_hash}
+            self._save()
+            return entry
+
+    def export(self) -> Dict[str, Any]:
+        """Copy of the manifest contents, e.g. for a snapshot."""
+        with self._lock:
+            return {"documents": dict(self.documents), "files": dict(self.files), "deleted": dict(self.deleted)}
+
+    def merge(self, documents: Dict[str, Dict[str, Any]], files: Dict[str, str], deleted: Optional[Dict[str, str]] = None):
+        """Add entries and tombstones from another manifest (e.g. a snapshot) and persist."""
+        with self._lock:
+            self.documents.update(documents)
+            self.files.update(files)
+            for file_name, content_hash in (deleted or {}).items():
+                if file_name not in self.files:
+                    self.deleted[file_name] = content_hash
+            self._save()
+
+    def clear(self):
+        """Forget every document and tombstone and persist the empty manifest."""
+        with self._lock:
+            self.documents = {}
+            self.files = {}
+            self.deleted = {}
+            self._save()
+
+    def release(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Drop a document entry if no file name refers to it any more.
+
+        Returns:
+            The dropped entry, or None if it is still referenced
+        """
+        with self._lock:
+            if content_hash in self.files.values():
+                return None
+            entry = self.documents.pop(content_hash, None)
+            self._save()
+            return entry
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from inference_pool import InferencePool
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    def __init__(self, store, pool: InferencePool, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Collect concurrent search queries into micro-batches.
+
+        The first query of a batch waits at most max_wait_ms for others to
+        arrive; the batch is then encoded in one model call and run as one
+        multi-query collection lookup on the inference pool. Queries for
+        different stores (shards) share the collection window and their
+        lookups run concurrently; a query sent to several shards is encoded
+        once, with the default store's model and query cache, which every
+        shard shares.
+
+        Args:
+            store: The embedding store searched when a query names none, and
+                the one that encodes every batch
+            pool: Inference pool the batched searches run on
+            max_batch_size: Most queries in one batch
+            max_wait_ms: Longest the first query of a batch waits for company
+        """
+        self.store = store
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Batches being executed; the loop only holds weak references to tasks
+        self._batches: Set[asyncio.Task] = set()
+
+        self.stats = {
+            "batches": 0,
+            "queries": 0,
+            "max_batch_size_seen": 0,
+            "batch_sizes": {},
+            "total_queue_delay_ms": 0.0,
+            "max_queue_delay_ms": 0.0
+        }
+
+    async def start(self):
+        """Start collecting batches on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stop collecting batches and wait for those already dispatched to finish."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        # Queries that never made it into a batch
+        while self._queue is not None and not self._queue.empty():
+            future = self._queue.get_nowait()[3]
+            if not future.done():
+                future.cancel()
+
+    async def search(self, query_text: str, n_results: int = 5, filters: Optional[Dict[str, Any]] = None, store=None) -> List[Dict[str, Any]]:
+        """
+        Queue a query for the next batch and wait for its results.
+
+        Queries with different filters can share a batch; the store encodes
+        them together and runs one lookup per distinct filter.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query_text, n_results, filters, future, time.perf_counter(), store or self.store))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_seconds
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Keep collecting the next batch while this one runs
+            task = asyncio.create_task(self._execute(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _execute(self, batch: List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future, float, Any]]):
+        dispatched = time.perf_counter()
+        self._record(batch, dispatched)
+
+        # Encode each distinct query once, however many shards it goes to
+        texts = list(dict.fromkeys(item[0] for item in batch))
+        try:
+            embeddings = dict(zip(texts, await self.pool.run(self.store.encode_queries, texts)))
+        except Exception as e:
+            for item in batch:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        # One lookup per store, run side by side
+        groups: Dict[int, List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future, float, Any]]] = {}
+        for item in batch:
+            groups.setdefault(id(item[5]), []).append(item)
+        await asyncio.gather(*(self._execute_group(group, embeddings) for group in groups.values()))
+
+    async def _execute_group(self, group: List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future, float, Any]], embeddings: Dict[str, List[float]]):
+        try:
+            results = await self.pool.run(
+                group[0][5].search_batch,
+                [item[0] for item in group],
+                [item[1] for item in group],
+                [item[2] for item in group],
+                [embeddings[item[0]] for item in group],
+                return_exceptions=True
+            )
+        except Exception as e:
+            for item in group:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        # A failed filter group only fails its own queries
+        for item, result in zip(group, results):
+            if item[3].done():
+                continue
+            if isinstance(result, Exception):
+                item[3].set_exception(result)
+            else:
+                item[3].set_result(result)
+
+    def _record(self, batch: List[Tuple[str, int, Optional[Dict[str, Any]], asyncio.Future, float, Any]], dispatched: float):
+        size = len(batch)
+        delays_ms = [(dispatched - item[4]) * 1000.0 for item in batch]
+
+        self.stats["batches"] += 1
+        self.stats["queries"] += size
+        self.stats["max_batch_size_seen"] = max(self.stats["max_batch_size_seen"], size)
+        self.stats["batch_sizes"][size] = self.stats["batch_sizes"].get(size, 0) + 1
+        self.stats["total_queue_delay_ms"] += sum(delays_ms)
+        self.stats["max_queue_delay_ms"] = max(self.stats["max_queue_delay_ms"], max(delays_ms))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Observed batch sizes and queueing delay."""
+        stats = dict(self.stats)
+        stats["batch_sizes"] = dict(sorted(self.stats["batch_sizes"].items()))
+        stats["mean_batch_size"] = stats["queries"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_queue_delay_ms"] = stats["total_queue_delay_ms"] / stats["queries"] if stats["queries"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait_seconds * 1000.0
+        return stats
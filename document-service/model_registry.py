@@ -0,0 +1,92 @@
+from sentence_transformers import SentenceTransformer
+import threading
+import logging
+from typing import Dict, List, Tuple
+
+import torch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "fp32" runs the model as published; "int8" quantizes its linear layers
+# dynamically for CPU inference
+INFERENCE_MODES = ("fp32", "int8")
+
+# One instance per model name and inference mode for the whole process
+_models: Dict[Tuple[str, str], SentenceTransformer] = {}
+_lock = threading.Lock()
+
+
+def set_inference_threads(threads: int):
+    """
+    Set the intra-op threads PyTorch uses for each forward pass (0 keeps its default).
+
+    The setting is process-wide; keep threads times the number of concurrent
+    encode callers at or below the core count to avoid oversubscription.
+    """
+    if threads > 0:
+        torch.set_num_threads(threads)
+        logger.info(f"PyTorch intra-op threads set to {threads}")
+
+
+def quantize_model(model: SentenceTransformer) -> SentenceTransformer:
+    """
+    Replace the model's linear layers with dynamically quantized int8 ones, in place.
+
+    Weights are stored as int8 and activations quantized per batch, which
+    speeds up the matrix multiplies that dominate transformer inference on
+    CPU at a small cost in embedding accuracy (see benchmark_embeddings.py).
+    """
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def get_model(model_name: str, inference_mode: str = "fp32") -> SentenceTransformer:
+    """
+    Return the process-wide instance of a sentence-transformers model.
+
+    The model is loaded on first use; concurrent callers wait for that single
+    load instead of loading their own copy. With inference_mode "int8" the
+    loaded model is quantized before it is shared.
+    """
+    key = (model_name, inference_mode)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    if inference_mode not in INFERENCE_MODES:
+        raise ValueError(f"inference_mode must be one of {INFERENCE_MODES}")
+    with _lock:
+        if key not in _models:
+            logger.info(f"Loading embedding model: {model_name} ({inference_mode})")
+            model = SentenceTransformer(model_name, device="cpu" if inference_mode == "int8" else None)
+            _models[key] = quantize_model(model) if inference_mode == "int8" else model
+        return _models[key]
+
+
+def loaded_models() -> List[str]:
+    """Names of the models currently loaded in this process, with their inference mode."""
+    return [f"{model_name} ({inference_mode})" for model_name, inference_mode in _models]
+
+
+class SharedEmbeddingFunction:
+    def __init__(self, model_name: str, batch_size: int = 32, inference_mode: str = "fp32"):
+        """
+        ChromaDB embedding function backed by the shared model instance.
+
+        Args:
+            model_name: The sentence-transformers model to use
+            batch_size: Batch size for each encode call
+            inference_mode: "fp32" or "int8" (dynamically quantized, CPU only)
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.inference_mode = inference_mode
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return get_model(self.model_name, self.inference_mode).encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True
+        ).tolist()
@@ -1,89 +1,192 @@
 import fitz  # PyMuPDF
 import os
 import re
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Iterator, Tuple
 import logging
 
+from chunker import TokenChunker, get_tokenizer
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def clean_text(text: str) -> str:
-    """Clean extracted text by removing extra whitespace and other artifacts."""
-    # Replace multiple spaces, tabs, and newlines with a single space
-    text = re.sub(r'\s+', ' ', text)
+    """
+    Clean extracted text by removing extra whitespace and other artifacts.
+    
+    Line wraps are joined but paragraph breaks are kept, so the chunker can
+    still see sentence and paragraph boundaries.
+    """
     # Remove any non-printable characters
     text = re.sub(r'[^\x20-\x7E\s]', '', text)
+    # Replace runs of spaces and tabs with a single space and trim line ends
+    text = re.sub(r'[^\S\n]+', ' ', text)
+    text = re.sub(r' ?\n ?', '\n', text)
+    # Join wrapped lines and collapse blank-line runs into one paragraph break
+    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
     return text.strip()
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from a PDF file using PyMuPDF."""
-    logger.info(f"Processing PDF: {pdf_path}")
+def iter_pages(doc) -> Iterator[Tuple[int, str]]:
+    """
+    Yield the cleaned text of each page of an open PDF, one page at a time.
     
-    try:
-        # Open the PDF
-        doc = fitz.open(pdf_path)
-        full_text = ""
+    Args:
+        doc: An open PyMuPDF document
+        
+    Yields:
+        Tuples of (1-based page number, cleaned page text)
+    """
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        
+        # Extract and clean text from the page; only one page is held at a time
+        page_text = clean_text(page.get_text("text"))
+        
+        # Advanced: extract text from images if needed
+        # This would require OCR which is more complex
+        # If needed, we can add pytesseract or other OCR tools
+        
+        if page_text:
+            yield page_num + 1, page_text
+
+def get_pdf_metadata(doc, pdf_path: str) -> Dict[str, Any]:
+    """Read document metadata from an already open PDF."""
+    metadata = doc.metadata or {}
+    return {
+        "title": metadata.get("title", ""),
+        "author": metadata.get("author", ""),
+        "subject": metadata.get("subject", ""),
+        "keywords": metadata.get("keywords", ""),
+        "page_count": len(doc),
+        "file_name": os.path.basename(pdf_path)
+    }
 
-        # Process each page
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            
-            # Extract text from the page
-            page_text = page.get_text("text")
-            full_text += page_text + "\n\n"
-            
-            # Advanced: extract text from images if needed
-            # This would require OCR which is more complex
-            # If needed, we can add pytesseract or other OCR tools
+def iter_pdf_batches(
+    pdf_path: str,
+    max_tokens: int = 256,
+    overlap_tokens: int = 32,
+    model_name: str = "all-MiniLM-L6-v2",
+    batch_size: int = 64
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Extract, clean and chunk a single PDF, yielding its chunks in batches.
+    
+    The file is opened once and streamed page by page into a token-budget
+    chunker, so only the current page and one batch of chunks are held in
+    memory however long the document is.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        max_tokens: The embedding model's max sequence length
+        overlap_tokens: Token overlap between consecutive chunks
+        model_name: The embedding model whose tokenizer sizes the chunks
+        batch_size: Chunks per yielded batch
         
-        # Clean the extracted text
-        cleaned_text = clean_text(full_text)
-        logger.info(f"Successfully extracted text from {pdf_path}")
-        return cleaned_text
+    Yields:
+        ("metadata", document metadata) first, then ("chunks", (chunk texts,
+        per-chunk provenance metadata)) per batch, then ("done", page count
+        and per-stage timings)
+    """
+    logger.info(f"Processing PDF: {pdf_path}")
+    start = time.perf_counter()
+    extract_seconds = 0.0
+    handoff_seconds = 0.0
     
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-        raise Exception(f"Failed to process PDF: {str(e)}")
+    def timed_pages(doc):
+        # Attribute time spent producing pages to extraction, the rest to chunking
+        nonlocal extract_seconds
+        pages = iter_pages(doc)
+        while True:
+            page_start = time.perf_counter()
+            page = next(pages, None)
+            extract_seconds += time.perf_counter() - page_start
+            if page is None:
+                return
+            yield page
+    
+    def hand_off(event: Tuple[str, Any]):
+        # Time the consumer holds us up is neither extraction nor chunking
+        nonlocal handoff_seconds
+        handed = time.perf_counter()
+        yield event
+        handoff_seconds += time.perf_counter() - handed
+    
+    chunker = TokenChunker(get_tokenizer(model_name), max_tokens, overlap_tokens)
+    with fitz.open(pdf_path) as doc:
+        metadata = get_pdf_metadata(doc, pdf_path)
+        yield from hand_off(("metadata", metadata))
+        chunks, chunk_metadatas = [], []
+        for chunk in chunker.chunk_pages(timed_pages(doc)):
+            chunks.append(chunk.pop("text"))
+            chunk_metadatas.append(chunk)
+            if len(chunks) >= batch_size:
+                yield from hand_off(("chunks", (chunks, chunk_metadatas)))
+                chunks, chunk_metadatas = [], []
+        if chunks:
+            yield from hand_off(("chunks", (chunks, chunk_metadatas)))
+    
+    yield "done", {
+        "page_count": metadata.get("page_count", 0),
+        "extract_seconds": extract_seconds,
+        "chunk_seconds": time.perf_counter() - start - extract_seconds - handoff_seconds
+    }
 
-def extract_metadata_from_pdf(pdf_path: str) -> Dict[str, Any]:
-    """Extract metadata from a PDF file."""
+def stream_pdf(pdf_path: str, batches, max_tokens: int = 256, overlap_tokens: int = 32, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64):
+    """
+    Extract and chunk a PDF, putting each event of iter_pdf_batches on a queue.
+    
+    This is the unit of work for the parallel ingestion pool: it only touches
+    the file system and hands over plain picklable batches, so the writer can
+    embed a document's first chunks while the rest are still being extracted.
+    Every event is put as (kind, pdf_path, payload); an error ends the stream
+    with ("failed", pdf_path, message) instead of "done". A bounded queue
+    holds extraction back when the writer falls behind.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        batches: Queue the events are put on (a multiprocessing manager queue across processes)
+        max_tokens: The embedding model's max sequence length
+        overlap_tokens: Token overlap between consecutive chunks
+        model_name: The embedding model whose tokenizer sizes the chunks
+        batch_size: Chunks per batch
+    """
     try:
-        doc = fitz.open(pdf_path)
-        metadata = doc.metadata
-        return {
-            "title": metadata.get("title", ""),
-            "author": metadata.get("author", ""),
-            "subject": metadata.get("subject", ""),
-            "keywords": metadata.get("keywords", ""),
-            "page_count": len(doc),
-            "file_name": os.path.basename(pdf_path)
-        }
+        for kind, payload in iter_pdf_batches(pdf_path, max_tokens, overlap_tokens, model_name, batch_size):
+            batches.put((kind, pdf_path, payload))
     except Exception as e:
-        logger.error(f"Error extracting metadata from {pdf_path}: {str(e)}")
-        return {"file_name": os.path.basename(pdf_path)}
+        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+        batches.put(("failed", pdf_path, f"Failed to process PDF: {str(e)}"))
 
-def chunk_text(text, chunk_size=1000, chunk_overlap=200):
-    # Improve chunking to respect paragraph boundaries
-    paragraphs = text.split('\n\n')
-    chunks = []
-    current_chunk = ""
+def process_pdf(pdf_path: str, max_tokens: int = 256, overlap_tokens: int = 32, model_name: str = "all-MiniLM-L6-v2") -> Dict[str, Any]:
+    """
+    Extract, clean and chunk a single PDF into one result.
     
-    for para in paragraphs:
-        if len(current_chunk) + len(para) <= chunk_size:
-            current_chunk += para + "\n\n"
-        else:
-            # Store the current chunk
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # Start a new chunk, including overlap
-            words = current_chunk.split()
-            overlap_text = ' '.join(words[-30:]) if len(words) > 30 else ''
-            current_chunk = overlap_text + "\n\n" + para + "\n\n"
+    Ingestion streams batches with stream_pdf instead; this suits tools that
+    want a whole document at once, such as the embedding benchmark.
     
-    # Add the final chunk
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+    Args:
+        pdf_path: Path to the PDF file
+        max_tokens: The embedding model's max sequence length
+        overlap_tokens: Token overlap between consecutive chunks
+        model_name: The embedding model whose tokenizer sizes the chunks
+        
+    Returns:
+        Dict with the chunk texts, per-chunk provenance metadata, document
+        metadata and per-stage timings
+    """
+    result = {"pdf_path": pdf_path, "chunks": [], "chunk_metadatas": []}
+    try:
+        for kind, payload in iter_pdf_batches(pdf_path, max_tokens, overlap_tokens, model_name):
+            if kind == "metadata":
+                result["metadata"] = payload
+            elif kind == "chunks":
+                result["chunks"].extend(payload[0])
+                result["chunk_metadatas"].extend(payload[1])
+            else:
+                result.update(payload)
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+        raise Exception(f"Failed to process PDF: {str(e)}")
+    return result
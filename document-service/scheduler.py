@@ -0,0 +1,255 @@
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "bulk", "reindex")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next checkpoint after it is cancelled."""
+
+
+class JobControl:
+    def __init__(self):
+        """Pause/resume/cancel flags a running job polls at its checkpoints."""
+        self._running = threading.Event()
+        self._running.set()
+        self.cancelled = False
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._running.set()
+
+    def checkpoint(self):
+        """Block while paused; raise JobCancelled once cancelled."""
+        self._running.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class IngestScheduler:
+    def __init__(self, slots: Dict[str, int], on_state: Optional[Callable[[str, str], None]] = None):
+        """
+        Run ingestion jobs by priority class, each class within its own thread budget.
+
+        A free worker always takes the oldest queued job of the highest
+        priority class that is below its budget, so an interactive upload
+        never waits behind a bulk corpus. Jobs receive a JobControl and call
+        its checkpoint() between units of work to honour pause and cancel.
+
+        Args:
+            slots: Most jobs of each priority class running at once
+            on_state: Called with (job_id, state) when the scheduler changes a job's state
+        """
+        unknown = set(slots) - set(PRIORITY_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown priority classes: {sorted(unknown)}")
+        self.slots = {name: max(1, slots.get(name, 1)) for name in PRIORITY_CLASSES}
+        self.on_state = on_state
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[Tuple[str, Callable, tuple, dict]]] = {name: deque() for name in PRIORITY_CLASSES}
+        self._running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._controls: Dict[str, JobControl] = {}
+        self._started: Dict[str, bool] = {}
+        self._stopped = False
+        self.stats = {name: {"submitted": 0, "completed": 0, "cancelled": 0} for name in PRIORITY_CLASSES}
+
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"ingest-{i}")
+            for i in range(sum(self.slots.values()))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job_id: str, priority: str, fn: Callable, *args, paused: bool = False, **kwargs) -> JobControl:
+        """
+        Queue fn(*args, control=..., **kwargs) in a priority class.
+
+        With paused, the job is queued already paused, so it cannot start
+        before resume() is called.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"priority must be one of {PRIORITY_CLASSES}")
+        control = JobControl()
+        if paused:
+            control.pause()
+        with self._cond:
+            self._controls[job_id] = control
+            self._started[job_id] = False
+            self._queues[priority].append((job_id, fn, args, kwargs))
+            self.stats[priority]["submitted"] += 1
+            self._cond.notify_all()
+        return control
+
+    def _next(self) -> Optional[Tuple[str, str, Callable, tuple, dict]]:
+        for priority in PRIORITY_CLASSES:
+            if self._running[priority] >= self.slots[priority]:
+                continue
+            queue = self._queues[priority]
+            # Paused jobs that have not started yet stay queued
+            for _ in range(len(queue)):
+                job_id, fn, args, kwargs = queue.popleft()
+                if self._controls[job_id].cancelled:
+                    continue
+                if self._controls[job_id].paused:
+                    queue.append((job_id, fn, args, kwargs))
+                    continue
+                return priority, job_id, fn, args, kwargs
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    if self._stopped:
+                        return
+                    self._cond.wait(timeout=1.0)
+                    job = self._next()
+                priority, job_id, fn, args, kwargs = job
+                self._running[priority] += 1
+                self._started[job_id] = True
+                control = self._controls[job_id]
+
+            try:
+                fn(*args, control=control, **kwargs)
+            except JobCancelled:
+                pass
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    self.stats[priority]["cancelled" if control.cancelled else "completed"] += 1
+                    self._controls.pop(job_id, None)
+                    self._started.pop(job_id, None)
+                    self._cond.notify_all()
+
+    def _set_state(self, job_id: str, state: str):
+        if self.on_state:
+            self.on_state(job_id, state)
+
+    def pause(self, job_id: str) -> bool:
+        """Pause a queued or running job at its next checkpoint."""
+        with self._cond:
+            control = self._controls.get(job_id)
+        if control is None or control.cancelled:
+            return False
+        control.pause()
+        self._set_state(job_id, "paused")
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """Let a paused job continue."""
+        with self._cond:
+            control = self._controls.get(job_id)
+            started = self._started.get(job_id, False)
+            if control is None or control.cancelled:
+                return False
+            control.resume()
+            self._cond.notify_all()
+        self._set_state(job_id, "processing" if started else "queued")
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job; a running job stops at its next checkpoint."""
+        with self._cond:
+            control = self._controls.get(job_id)
+            if control is None:
+                return False
+            control.cancel()
+            if not self._started.get(job_id):
+                # Never started: drop it now
+                for priority, queue in self._queues.items():
+                    for item in list(queue):
+                        if item[0] == job_id:
+                            queue.remove(item)
+                            self.stats[priority]["cancelled"] += 1
+                self._controls.pop(job_id, None)
+                self._started.pop(job_id, None)
+            self._cond.notify_all()
+        self._set_state(job_id, "cancelled")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queued and running jobs and counters per priority class."""
+        with self._cond:
+            return {
+                priority: {
+                    "slots": self.slots[priority],
+                    "running": self._running[priority],
+                    "queued": len(self._queues[priority]),
+                    **self.stats[priority]
+                }
+                for priority in PRIORITY_CLASSES
+            }
+
+    def shutdown(self):
+        """Stop taking new jobs; running jobs finish in their daemon threads."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+class IngestThrottle:
+    def __init__(self, max_share: float = 0.5, idle_seconds: float = 2.0):
+        """
+        Cap ingestion's share of the embedding model while searches are active.
+
+        After each ingestion encode, if a search ran in the last idle_seconds,
+        the writer sleeps long enough that ingestion uses at most max_share of
+        the model's time, leaving the rest for queries. With no search
+        traffic, ingestion runs flat out.
+
+        Args:
+            max_share: Largest fraction of model time ingestion may use under search load (1.0 disables)
+            idle_seconds: How long after the last search the cap stays in force
+        """
+        self.max_share = max_share
+        self.idle_seconds = idle_seconds
+        self._last_search = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"throttled_encodes": 0, "throttled_seconds": 0.0}
+
+    def note_search(self):
+        """Record that a search just ran."""
+        self._last_search = time.monotonic()
+
+    @property
+    def searches_active(self) -> bool:
+        return time.monotonic() - self._last_search < self.idle_seconds
+
+    def after_encode(self, busy_seconds: float):
+        """Sleep as needed after an ingestion encode that took busy_seconds."""
+        if self.max_share >= 1.0 or not self.searches_active:
+            return
+        pause = busy_seconds * (1.0 - self.max_share) / max(self.max_share, 0.01)
+        with self._lock:
+            self.stats["throttled_encodes"] += 1
+            self.stats["throttled_seconds"] += pause
+        time.sleep(pause)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_share": self.max_share,
+            "searches_active": self.searches_active,
+            **self.stats
+        }
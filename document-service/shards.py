@@ -0,0 +1,146 @@
+import heapq
+import os
+import re
+import threading
+import logging
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from embedding_store import EmbeddingStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "default"
+
+# Shard names double as Chroma collection names (3-63 chars, alphanumeric at both ends)
+SHARD_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{1,61}[a-z0-9]$")
+
+
+def validate_shard_name(name: str) -> str:
+    """Check a shard name is usable as a directory and collection name."""
+    if name != DEFAULT_SHARD and not SHARD_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid shard name {name!r}: use 3-63 lower-case letters, digits, '-' or '_'")
+    return name
+
+
+class ShardRegistry:
+    def __init__(
+        self,
+        store_options: Dict[str, Any],
+        default_directory: str = "./chroma_db",
+        shard_root: str = "./chroma_shards",
+        shard_directories: Optional[Dict[str, str]] = None
+    ):
+        """
+        Named embedding stores, one per shard (tenant, region, document type...).
+
+        Each shard is a complete EmbeddingStore with its own collection,
+        manifest, keyword index and writer in its own directory, so shards
+        can live on separate disks. The default shard is the original
+        "esg_documents" collection. Shards found on disk are opened at
+        startup; new ones are created on first ingest. All shards use the
+        same model, so they share one query embedding cache, and a query
+        searched on every shard is encoded once.
+
+        Args:
+            store_options: Keyword arguments for every EmbeddingStore
+            default_directory: Persist directory of the default shard
+            shard_root: Directory that holds one subdirectory per other shard
+            shard_directories: Explicit directories for particular shards
+        """
+        self.store_options = store_options
+        self.default_directory = default_directory
+        self.shard_root = shard_root
+        self.shard_directories = dict(shard_directories or {})
+        for name in self.shard_directories:
+            validate_shard_name(name)
+
+        self._lock = threading.Lock()
+        self._stores: Dict[str, EmbeddingStore] = {}
+        self.query_embedding_cache = LRUCache(store_options.get("query_cache_size", 4096))
+
+        self._open(DEFAULT_SHARD)
+        existing = set(self.shard_directories)
+        if os.path.isdir(shard_root):
+            existing.update(name for name in os.listdir(shard_root) if SHARD_NAME_PATTERN.match(name))
+        for name in sorted(existing):
+            if os.path.isdir(self.directory_for(name)):
+                self._open(name)
+
+    @property
+    def default(self) -> EmbeddingStore:
+        return self._stores[DEFAULT_SHARD]
+
+    def directory_for(self, name: str) -> str:
+        """Persist directory of a shard."""
+        if name == DEFAULT_SHARD:
+            return self.default_directory
+        return self.shard_directories.get(name, os.path.join(self.shard_root, name))
+
+    def _open(self, name: str) -> EmbeddingStore:
+        collection_name = "esg_documents" if name == DEFAULT_SHARD else name
+        logger.info(f"Opening shard {name} in {self.directory_for(name)}")
+        store = EmbeddingStore(
+            persist_directory=self.directory_for(name),
+            collection_name=collection_name,
+            query_embedding_cache=self.query_embedding_cache,
+            **self.store_options
+        )
+        self._stores[name] = store
+        return store
+
+    def names(self) -> List[str]:
+        return sorted(self._stores)
+
+    def items(self) -> List[Tuple[str, EmbeddingStore]]:
+        return sorted(self._stores.items())
+
+    def get(self, name: Optional[str] = None) -> EmbeddingStore:
+        """
+        An existing shard's store (the default shard if name is None).
+
+        Raises:
+            KeyError: If the shard does not exist
+        """
+        return self._stores[name or DEFAULT_SHARD]
+
+    def get_or_create(self, name: Optional[str] = None) -> EmbeddingStore:
+        """A shard's store, creating the shard if it is new (for ingestion)."""
+        name = validate_shard_name(name or DEFAULT_SHARD)
+        with self._lock:
+            store = self._stores.get(name)
+            return store if store is not None else self._open(name)
+
+    def select(self, names: Optional[List[str]] = None) -> List[Tuple[str, EmbeddingStore]]:
+        """
+        The shards a query targets: all of them if names is None.
+
+        Raises:
+            KeyError: If a named shard does not exist
+        """
+        if names is None:
+            return self.items()
+        return [(name, self._stores[name]) for name in dict.fromkeys(names)]
+
+
+def merge_top_k(ranked_lists: Dict[str, List[Dict[str, Any]]], n_results: int, higher_is_better: bool = False) -> List[Dict[str, Any]]:
+    """
+    Merge per-shard result lists, each already sorted best first, into one top k.
+
+    A heap-based k-way merge only looks at as many results as it returns.
+    Each merged result is tagged with the shard it came from.
+
+    Args:
+        ranked_lists: Sorted result lists keyed by shard name
+        n_results: Number of results to return
+        higher_is_better: True for similarity scores such as BM25, False for distances
+    """
+    tagged = [
+        ({**result, "shard": shard} for result in results)
+        for shard, results in ranked_lists.items()
+    ]
+    merged = heapq.merge(*tagged, key=lambda result: result["score"], reverse=higher_is_better)
+    return list(islice(merged, n_results))
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_INFO = "snapshot.json"
+RECORDS_FILE = "records.jsonl"
+EMBEDDINGS_FILE = "embeddings.f16"
+MANIFEST_FILE = "manifest.json"
+HASH_BLOCK_SIZE = 1024 * 1024  # bytes read per hash update
+
+
+class SnapshotError(ValueError):
+    """A snapshot is corrupt or incompatible with this store."""
+
+
+class _HashingWriter:
+    """File wrapper that computes the SHA-256 of everything written through it."""
+
+    def __init__(self, path: str, mode: str = "wb"):
+        self.file = open(path, mode)
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.digest.update(data)
+        self.file.write(data)
+
+    def close(self) -> str:
+        self.file.close()
+        return self.digest.hexdigest()
+
+
+def export_snapshot(store, snapshot_path: str, page_size: int = 1000) -> Dict[str, Any]:
+    """
+    Write every chunk of a store to a portable snapshot archive.
+
+    The archive is a zip holding chunk texts and metadata as JSON lines,
+    embeddings as a raw float16 matrix, the document manifest, and a
+    snapshot.json with the model name, dimensions and a SHA-256 per member.
+    Writes are paused (store.write_paused) while chunks and the manifest are
+    read, so writes, deletes and compaction wait rather than shift the pages
+    mid-export; searches carry on.
+
+    Args:
+        store: The embedding store to export
+        snapshot_path: Path of the .zip archive to create
+        page_size: Chunks read from the collection at a time
+
+    Returns:
+        The snapshot info (also stored in the archive as snapshot.json)
+    """
+    work_dir = tempfile.mkdtemp(prefix="snapshot-")
+    try:
+        records = _HashingWriter(os.path.join(work_dir, RECORDS_FILE))
+        embeddings = _HashingWriter(os.path.join(work_dir, EMBEDDINGS_FILE))
+        manifest = _HashingWriter(os.path.join(work_dir, MANIFEST_FILE))
+        chunks = 0
+        dim = None
+        with store.write_paused():
+            for page in store.iter_chunks(page_size, include=["documents", "metadatas", "embeddings"]):
+                matrix = np.asarray(page["embeddings"], dtype="<f2")
+                dim = matrix.shape[1]
+                embeddings.write(matrix.tobytes())
+                for i, chunk_id in enumerate(page["ids"]):
+                    record = {"id": chunk_id, "document": page["documents"][i], "metadata": page["metadatas"][i]}
+                    records.write((json.dumps(record) + "\n").encode("utf-8"))
+                chunks += len(page["ids"])
+            manifest.write(json.dumps(store.manifest.export()).encode("utf-8"))
+
+        info = {
+            "format": SNAPSHOT_FORMAT,
+            "model_name": store.model_name,
+            "dim": dim,
+            "dtype": "float16",
+            "chunks": chunks,
+            "created_at": datetime.utcnow().isoformat(),
+            "checksums": {
+                RECORDS_FILE: records.close(),
+                EMBEDDINGS_FILE: embeddings.close(),
+                MANIFEST_FILE: manifest.close()
+            }
+        }
+
+        # Write next to the target and rename so a partial archive is never picked up
+        tmp_path = f"{snapshot_path}.tmp"
+        with zipfile.ZipFile(tmp_path, "w") as archive:
+            archive.writestr(SNAPSHOT_INFO, json.dumps(info, indent=2))
+            archive.write(os.path.join(work_dir, RECORDS_FILE), RECORDS_FILE, compress_type=zipfile.ZIP_DEFLATED)
+            archive.write(os.path.join(work_dir, MANIFEST_FILE), MANIFEST_FILE, compress_type=zipfile.ZIP_DEFLATED)
+            # float16 noise barely compresses; store it as is
+            archive.write(os.path.join(work_dir, EMBEDDINGS_FILE), EMBEDDINGS_FILE, compress_type=zipfile.ZIP_STORED)
+        os.replace(tmp_path, snapshot_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(f"Exported {chunks} chunks to {snapshot_path}")
+    return info
+
+
+def read_snapshot_info(archive: zipfile.ZipFile) -> Dict[str, Any]:
+    """Read and check the snapshot.json of an open archive."""
+    try:
+        info = json.loads(archive.read(SNAPSHOT_INFO))
+    except KeyError:
+        raise SnapshotError(f"Not a snapshot: {SNAPSHOT_INFO} is missing")
+    if info.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {info.get('format')}")
+    return info
+
+
+def verify_snapshot(archive: zipfile.ZipFile, info: Dict[str, Any]):
+    """Check every member against the checksums recorded at export."""
+    for name, expected in info["checksums"].items():
+        digest = hashlib.sha256()
+        try:
+            with archive.open(name) as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                    digest.update(block)
+        except KeyError:
+            raise SnapshotError(f"Snapshot member {name} is missing")
+        if digest.hexdigest() != expected:
+            raise SnapshotError(f"Checksum mismatch for {name}")
+
+
+def _iter_pages(archive: zipfile.ZipFile, info: Dict[str, Any], page_size: int) -> Iterator[Tuple[List[str], List[List[float]], List[str], List[Dict[str, Any]]]]:
+    row_bytes = info["dim"] * 2
+    with archive.open(RECORDS_FILE) as records, archive.open(EMBEDDINGS_FILE) as embeddings:
+        page: List[Dict[str, Any]] = []
+        for line in records:
+            page.append(json.loads(line))
+            if len(page) == page_size:
+                yield _page(page, embeddings.read(row_bytes * len(page)), info["dim"])
+                page = []
+        if page:
+            yield _page(page, embeddings.read(row_bytes * len(page)), info["dim"])
+
+
+def _page(records: List[Dict[str, Any]], raw: bytes, dim: int) -> Tuple[List[str], List[List[float]], List[str], List[Dict[str, Any]]]:
+    matrix = np.frombuffer(raw, dtype="<f2").reshape(len(records), dim).astype(np.float32)
+    return (
+        [record["id"] for record in records],
+        matrix.tolist(),
+        [record["document"] for record in records],
+        [record["metadata"] for record in records]
+    )
+
+
+def import_snapshot(store, snapshot_path: str, replace: bool = False, page_size: int = 1000) -> Dict[str, Any]:
+    """
+    Bulk-load a snapshot into a store without re-embedding anything.
+
+    The archive is verified against its checksums before any chunk is
+    written, and must have been exported with the same embedding model.
+    Files that are not zip archives, or lack a member, are rejected with
+    SnapshotError like any other corrupt snapshot.
+
+    Args:
+        store: The embedding store to load into
+        snapshot_path: Path of the .zip archive
+        replace: Clear a non-empty store first; otherwise it must be empty
+        page_size: Chunks written at a time
+
+    Returns:
+        The snapshot info plus the number of chunks loaded
+
+    Raises:
+        SnapshotError: If the archive is corrupt, incompatible, or the store is not empty
+    """
+    try:
+        with zipfile.ZipFile(snapshot_path) as archive:
+            info = read_snapshot_info(archive)
+            if info["model_name"] != store.model_name:
+                raise SnapshotError(f"Snapshot was embedded with {info['model_name']}, this store uses {store.model_name}")
+            missing = {RECORDS_FILE, EMBEDDINGS_FILE, MANIFEST_FILE} - set(archive.namelist())
+            if missing:
+                raise SnapshotError(f"Snapshot members {sorted(missing)} are missing")
+            verify_snapshot(archive, info)
+
+            store.writer.flush()
+            if store.collection.count() > 0:
+                if not replace:
+                    raise SnapshotError("The store already holds chunks; import with replace to overwrite them")
+                store.clear()
+
+            loaded = store.bulk_load(_iter_pages(archive, info, page_size)) if info["chunks"] else 0
+            manifest = json.loads(archive.read(MANIFEST_FILE))
+            store.manifest.merge(manifest.get("documents", {}), manifest.get("files", {}), manifest.get("deleted", {}))
+    except zipfile.BadZipFile as e:
+        raise SnapshotError(f"Not a snapshot archive: {str(e)}")
+    except KeyError as e:
+        raise SnapshotError(f"Snapshot is incomplete: {str(e)} is missing")
+
+    logger.info(f"Imported {loaded} chunks from {snapshot_path}")
+    return {**info, "loaded": loaded}
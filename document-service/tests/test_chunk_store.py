@@ -0,0 +1,70 @@
+from chunk_store import ChunkStore
+
+
+def test_put_and_get(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0", "a_1"], ["green bond", "carbon émissions"])
+
+    assert store.get(["a_0", "a_1", "missing"]) == {"a_0": "green bond", "a_1": "carbon émissions"}
+    assert len(store) == 2
+    store.close()
+
+
+def test_reads_after_later_writes_remap(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0"], ["first"])
+    assert store.get(["a_0"]) == {"a_0": "first"}
+    store.put(["b_0"], ["second"])
+    assert store.get(["a_0", "b_0"]) == {"a_0": "first", "b_0": "second"}
+    store.close()
+
+
+def test_overwrite_and_delete_survive_reopen(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0", "a_1", "b_0"], ["old", "other", "keep"])
+    store.put(["a_0"], ["new"])
+    store.delete_document("a")
+    store.put(["a_0"], ["newest"])
+    store.close()
+
+    reopened = ChunkStore(str(tmp_path))
+    assert reopened.get(["a_0", "a_1", "b_0"]) == {"a_0": "newest", "b_0": "keep"}
+    reopened.close()
+
+
+def test_entries_past_the_data_file_are_ignored(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0"], ["green bond"])
+    store.close()
+    # An index entry whose data never reached the disk
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write("b_0 1000000 10\n")
+
+    reopened = ChunkStore(str(tmp_path))
+    assert len(reopened) == 1
+    reopened.close()
+
+
+def test_compact_reclaims_deleted_space(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0", "b_0"], ["x" * 1000, "keep"])
+    store.delete(["a_0"])
+    before = store.stored_bytes
+
+    assert store.compact() > 0
+    assert store.stored_bytes < before
+    assert store.get(["a_0", "b_0"]) == {"b_0": "keep"}
+    store.close()
+
+    reopened = ChunkStore(str(tmp_path))
+    assert reopened.get(["b_0"]) == {"b_0": "keep"}
+    reopened.close()
+
+
+def test_clear(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store.put(["a_0"], ["green bond"])
+    store.clear()
+    assert len(store) == 0
+    assert store.get(["a_0"]) == {}
+    store.close()
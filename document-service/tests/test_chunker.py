@@ -0,0 +1,68 @@
+import re
+
+from chunker import TokenChunker
+
+
+class WordTokenizer:
+    """Stands in for a fast Hugging Face tokenizer: one token per word, [CLS] and [SEP] around."""
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        if isinstance(text, list):
+            return {"input_ids": [self(item, add_special_tokens)["input_ids"] for item in text]}
+        words = list(re.finditer(r"\S+", text))
+        encoded = {"input_ids": [hash(match.group()) for match in words]}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = [match.span() for match in words]
+        return encoded
+
+
+def chunk(pages, max_tokens=12, overlap_tokens=4):
+    return list(TokenChunker(WordTokenizer(), max_tokens, overlap_tokens).chunk_pages(pages))
+
+
+def test_chunks_stay_within_the_budget():
+    text = " ".join(f"Sentence {i} has four words." for i in range(20))
+    chunks = chunk([(1, text)])
+
+    assert len(chunks) > 1
+    # max_tokens minus the two special tokens
+    assert all(c["token_count"] <= 10 for c in chunks)
+    assert all(len(c["text"].split()) == c["token_count"] for c in chunks)
+
+
+def test_offsets_point_into_the_page():
+    text = "First sentence here. Second one follows. Third closes it."
+    for c in chunk([(1, text)], max_tokens=8, overlap_tokens=0):
+        assert text[c["char_start"]:c["char_end"]] == c["text"]
+
+
+def test_trailing_sentences_overlap_into_the_next_chunk():
+    text = "One two three. Four five six. Seven eight nine. Ten eleven twelve."
+    chunks = chunk([(1, text)], max_tokens=8, overlap_tokens=3)
+
+    assert chunks[0]["text"] == "One two three. Four five six."
+    assert chunks[1]["text"].startswith("Four five six.")
+
+
+def test_long_sentences_are_cut_into_windows():
+    text = " ".join(f"w{i}" for i in range(25))
+    chunks = chunk([(1, text)], max_tokens=12, overlap_tokens=0)
+
+    assert [c["token_count"] for c in chunks] == [10, 10, 5]
+    assert " ".join(c["text"] for c in chunks) == text
+
+
+def test_chunks_span_pages():
+    chunks = chunk([(1, "Alpha beta."), (2, "Gamma delta."), (3, "Epsilon zeta eta theta iota kappa lambda.")], max_tokens=8, overlap_tokens=0)
+
+    assert chunks[0]["text"] == "Alpha beta. Gamma delta."
+    assert (chunks[0]["page_number"], chunks[0]["page_end"]) == (1, 2)
+    assert (chunks[1]["page_number"], chunks[1]["page_end"]) == (3, 3)
+
+
+def test_empty_pages_yield_nothing():
+    # iter_pages strips page text and skips empty pages before they get here
+    assert chunk([(1, ""), (2, "")]) == []
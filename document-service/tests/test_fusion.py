@@ -0,0 +1,31 @@
+from fusion import RRF_K, reciprocal_rank_fusion
+
+
+def result(chunk_id, score):
+    return {"chunk_id": chunk_id, "text": chunk_id, "metadata": {}, "score": score}
+
+
+def test_chunks_in_both_lists_rank_first():
+    fused = reciprocal_rank_fusion({
+        "vector": [result("a", 0.1), result("b", 0.2), result("c", 0.3)],
+        "keyword": [result("c", 9.0), result("d", 5.0)]
+    }, n_results=4)
+
+    assert [entry["chunk_id"] for entry in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["score"] == 1.0 / (RRF_K + 3) + 1.0 / (RRF_K + 1)
+    assert fused[0]["ranks"] == {"vector": 3, "keyword": 1}
+    assert fused[0]["scores"] == {"vector": 0.3, "keyword": 9.0}
+
+
+def test_missing_sources_are_none_and_results_are_truncated():
+    fused = reciprocal_rank_fusion({"vector": [result("a", 0.1), result("b", 0.2)], "keyword": []}, n_results=1)
+
+    assert len(fused) == 1
+    assert fused[0]["chunk_id"] == "a"
+    assert fused[0]["ranks"] == {"vector": 1, "keyword": None}
+    assert fused[0]["scores"]["keyword"] is None
+
+
+def test_damping_constant():
+    fused = reciprocal_rank_fusion({"vector": [result("a", 0.1)]}, k=0)
+    assert fused[0]["score"] == 1.0
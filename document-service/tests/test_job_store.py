@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+from job_store import JobStore
+
+PARAMS = {"workers": 2, "tags": None, "shard": "default", "replaces": None}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def test_status_counts_and_throughput(db_path):
+    store = JobStore(db_path)
+    store.create("job", "bulk", ["/data/a.pdf", "/data/b.pdf", "/data/c.pdf"], PARAMS)
+    store.set_status("job", "processing")
+    store.update_file("job", "/data/a.pdf", "done", doc_id="h1", page_count=4, chunk_count=10,
+                      extract_seconds=1.0, chunk_seconds=0.5, embed_seconds=2.0, write_seconds=0.5)
+    store.update_file("job", "/data/b.pdf", "failed", error="Failed to process PDF")
+    store.update_file("job", "/data/c.pdf", "skipped")
+    store.set_status("job", "completed")
+
+    job = store.get("job")
+    assert job["status"] == "completed"
+    assert (job["processed_count"], job["total_count"], job["skipped_count"]) == (2, 3, 1)
+    assert job["failed_files"] == ["b.pdf"]
+    assert job["documents"] == [{"file_name": "a.pdf", "doc_id": "h1", "chunk_count": 10}]
+    assert job["throughput"]["pages_extracted"] == 4
+    assert job["throughput"]["chunks_written"] == 10
+    # Chunks per second of writer time (embed plus write)
+    assert job["throughput"]["chunks_per_second"] == 4.0
+    assert job["stages"]["bottleneck"] == "embed"
+    store.close()
+
+
+def test_update_file_keeps_state_when_none(db_path):
+    store = JobStore(db_path)
+    store.create("job", "bulk", ["/data/a.pdf"], PARAMS)
+    store.update_file("job", "/data/a.pdf", "extracting")
+    store.update_file("job", "/data/a.pdf", None, page_count=3)
+
+    assert store.get_files("job")[0]["state"] == "extracting"
+    assert store.get_files("job")[0]["page_count"] == 3
+    with pytest.raises(ValueError):
+        store.update_file("job", "/data/a.pdf", "exploded")
+    store.close()
+
+
+def set_owner(store, job_id, owner):
+    store._execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (owner, job_id))
+
+
+def test_jobs_of_a_live_process_are_not_claimed(db_path):
+    store = JobStore(db_path)
+    store.create("mine", "bulk", ["/data/a.pdf"], PARAMS)
+    store.create("theirs", "bulk", ["/data/b.pdf"], PARAMS)
+    # Another process that is still running (our parent)
+    set_owner(store, "theirs", f"{os.getppid()}:other")
+
+    assert store.claim_interrupted() == []
+    store.close()
+
+
+def test_interrupted_job_resumes_from_unfinished_files(db_path):
+    store = JobStore(db_path)
+    store.create("job", "bulk", ["/data/a.pdf", "/data/b.pdf", "/data/c.pdf"], PARAMS)
+    store.set_status("job", "paused")
+    store.update_file("job", "/data/a.pdf", "done")
+    store.update_file("job", "/data/b.pdf", "embedding")
+    # A previous incarnation of this process: same pid, other instance
+    set_owner(store, "job", f"{os.getpid()}:previous")
+    store.close()
+
+    restarted = JobStore(db_path)
+    claimed = restarted.claim_interrupted()
+    assert len(claimed) == 1
+    assert claimed[0]["status"] == "paused"
+    assert claimed[0]["params"] == PARAMS
+    assert claimed[0]["pending_files"] == ["/data/b.pdf", "/data/c.pdf"]
+    # Now owned by the restarted process, so it is not claimed again
+    assert restarted.claim_interrupted() == []
+    restarted.close()
+
+
+def test_list_jobs_newest_first(db_path):
+    store = JobStore(db_path)
+    store.create("old", "bulk", ["/data/a.pdf"], PARAMS)
+    time.sleep(0.01)
+    store.create("new", "interactive", ["/data/b.pdf", "/data/c.pdf"], PARAMS)
+    store.update_file("new", "/data/b.pdf", "done")
+
+    jobs = store.list_jobs()
+    assert [job["job_id"] for job in jobs] == ["new", "old"]
+    assert (jobs[0]["total_count"], jobs[0]["processed_count"]) == (2, 1)
+    store.close()
@@ -0,0 +1,94 @@
+import os
+
+from keyword_index import BM25Index, tokenize
+
+
+def open_index(tmp_path) -> BM25Index:
+    return BM25Index(str(tmp_path / "keyword_index.pkl"))
+
+
+def test_tokenize_keeps_clause_numbers_and_drops_stopwords():
+    assert tokenize("The CO2-e target in clause 4.2.1 of the policy") == ["co2-e", "target", "clause", "4.2.1", "policy"]
+
+
+def test_search_ranks_matching_chunks(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0", "b_0", "c_0"], ["green bond framework", "carbon tax and carbon credits", "board diversity"])
+
+    results = index.search("carbon", 5)
+    assert [chunk_id for chunk_id, _ in results] == ["b_0"]
+    assert index.search("unrelated", 5) == []
+    index.close()
+
+
+def test_log_is_replayed_without_a_checkpoint(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0", "a_1", "b_0"], ["green bond", "carbon bond", "carbon tax"])
+    index.remove_document("a")
+    index.close()
+
+    reloaded = open_index(tmp_path)
+    assert len(reloaded) == 1
+    assert [chunk_id for chunk_id, _ in reloaded.search("carbon", 5)] == ["b_0"]
+    reloaded.close()
+
+
+def test_checkpoint_folds_the_log_into_the_pickle(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0", "b_0"], ["green bond", "carbon bond"])
+    index.checkpoint()
+    assert index.log_bytes == 0
+    assert os.path.exists(index.index_path)
+
+    # Operations after the checkpoint are replayed over it
+    index.add(["c_0"], ["carbon tax"])
+    index.remove(["a_0"])
+    index.close()
+
+    reloaded = open_index(tmp_path)
+    assert len(reloaded) == 2
+    assert sorted(chunk_id for chunk_id, _ in reloaded.search("carbon", 5)) == ["b_0", "c_0"]
+    reloaded.close()
+
+
+def test_small_log_is_not_checkpointed_unless_forced(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0"], ["green bond"])
+    index.checkpoint(force=False)
+    assert not os.path.exists(index.index_path)
+    assert index.log_bytes > 0
+    index.close()
+
+
+def test_rotated_log_left_by_a_crash_is_replayed(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0"], ["green bond"])
+    index.close()
+    # As if a checkpoint had rotated the log and died before writing the pickle
+    os.replace(index.log_path, index.rotated_log_path)
+    with open(index.log_path, "w", encoding="utf-8"):
+        pass
+
+    reloaded = open_index(tmp_path)
+    reloaded.add(["b_0"], ["carbon bond"])
+    assert len(reloaded) == 2
+    reloaded.checkpoint()
+    assert not os.path.exists(reloaded.rotated_log_path)
+    reloaded.close()
+
+    assert len(open_index(tmp_path)) == 2
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    index = open_index(tmp_path)
+    index.add(["a_0"], ["green bond"])
+    index.close()
+    with open(index.log_path, "a", encoding="utf-8") as f:
+        f.write("b_0 carbon:1")
+
+    reloaded = open_index(tmp_path)
+    assert len(reloaded) == 1
+    reloaded.add(["c_0"], ["carbon tax"])
+    reloaded.close()
+
+    assert sorted(chunk_id for chunk_id, _ in open_index(tmp_path).search("carbon green", 5)) == ["a_0", "c_0"]
@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+from manifest import DocumentManifest, compute_file_hash, source_key
+
+
+def test_record_and_reload(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = DocumentManifest(path)
+    manifest.record("/data/a.pdf", "h1", "h1", 3)
+
+    reloaded = DocumentManifest(path)
+    assert reloaded.is_unchanged("/data/a.pdf", "h1")
+    assert not reloaded.is_unchanged("/data/a.pdf", "h2")
+    assert reloaded.get_file("/data/a.pdf")["chunk_count"] == 3
+
+
+def test_record_returns_replaced_hash(tmp_path):
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    assert manifest.record("/data/a.pdf", "h1", "h1", 3) is None
+    assert manifest.record("/data/a.pdf", "h1", "h1", 3) is None
+    assert manifest.record("/data/a.pdf", "h2", "h2", 4) == "h1"
+
+
+def test_link_shares_a_document(tmp_path):
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    manifest.record("/data/a.pdf", "h1", "h1", 3)
+    manifest.link("/other/a.pdf", "h1")
+
+    assert manifest.files_for("h1") == ["/data/a.pdf", "/other/a.pdf"]
+    assert manifest.file_names() == ["/data/a.pdf", "/other/a.pdf"]
+    # Still referenced by the other file
+    manifest.unlink("/data/a.pdf")
+    assert manifest.release("h1") is None
+    manifest.unlink("/other/a.pdf")
+    assert manifest.release("h1")["doc_id"] == "h1"
+
+
+def test_remove_leaves_tombstones(tmp_path):
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    manifest.record("/data/a.pdf", "h1", "h1", 3)
+    assert manifest.remove("h1")["chunk_count"] == 3
+    assert manifest.remove("h1") is None
+
+    assert manifest.is_deleted("/data/a.pdf", "h1")
+    assert not manifest.is_deleted("/data/a.pdf", "h2")
+    # Indexing the file again clears its tombstone
+    manifest.record("/data/a.pdf", "h1", "h1", 3)
+    assert not manifest.is_deleted("/data/a.pdf", "h1")
+
+
+def test_legacy_bare_names_move_to_full_key(tmp_path):
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    manifest.record("a.pdf", "h1", "h1", 3)
+    manifest.deleted["b.pdf"] = "h2"
+
+    assert manifest.is_deleted("/data/b.pdf", "h2")
+    assert manifest.record("/data/a.pdf", "h3", "h3", 1) == "h1"
+    assert "a.pdf" not in manifest.files
+    assert manifest.files["/data/a.pdf"] == "h3"
+
+
+def test_merge_keeps_tombstones_of_unknown_files(tmp_path):
+    manifest = DocumentManifest(str(tmp_path / "manifest.json"))
+    manifest.record("/data/a.pdf", "h1", "h1", 3)
+    manifest.merge({"h2": {"doc_id": "h2", "file_name": "/data/b.pdf", "chunk_count": 1}}, {"/data/b.pdf": "h2"}, {"/data/a.pdf": "h0", "/data/c.pdf": "h4"})
+
+    assert manifest.is_unchanged("/data/b.pdf", "h2")
+    assert not manifest.is_deleted("/data/a.pdf", "h0")
+    assert manifest.is_deleted("/data/c.pdf", "h4")
+
+
+def test_compute_file_hash_and_source_key(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    assert compute_file_hash(str(path)) == hashlib.sha256(b"%PDF-1.4 test").hexdigest()
+    assert source_key("a.pdf") == os.path.join(os.getcwd(), "a.pdf")
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import IngestScheduler, JobCancelled
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler():
+    states = []
+    scheduler = IngestScheduler({"interactive": 1, "bulk": 1, "reindex": 1}, on_state=lambda job_id, state: states.append((job_id, state)))
+    scheduler.states = states
+    yield scheduler
+    scheduler.shutdown()
+
+
+def blocking_job(started, release):
+    def run(name, control):
+        started.set()
+        release.wait(5)
+        control.checkpoint()
+    return run
+
+
+def test_higher_priority_runs_first(scheduler):
+    started, release = threading.Event(), threading.Event()
+    order = []
+    # Fill the bulk slot, then queue a second bulk job behind it
+    scheduler.submit("bulk-1", "bulk", blocking_job(started, release), "bulk-1")
+    wait_for(started.is_set)
+    scheduler.submit("bulk-2", "bulk", lambda name, control: order.append(name), "bulk-2")
+    # The interactive class has its own slot and does not wait for bulk
+    done = threading.Event()
+    scheduler.submit("upload", "interactive", lambda name, control: (order.append(name), done.set()), "upload")
+    assert done.wait(5)
+    assert order == ["upload"]
+
+    release.set()
+    wait_for(lambda: order == ["upload", "bulk-2"])
+    wait_for(lambda: scheduler.get_stats()["bulk"]["completed"] == 2)
+
+
+def test_unknown_priority_is_rejected(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.submit("job", "urgent", lambda control: None)
+    with pytest.raises(ValueError):
+        IngestScheduler({"urgent": 1})
+
+
+def test_job_submitted_paused_waits_for_resume(scheduler):
+    ran = threading.Event()
+    scheduler.submit("job", "reindex", lambda control: ran.set(), paused=True)
+    time.sleep(0.2)
+    assert not ran.is_set()
+    assert scheduler.get_stats()["reindex"]["queued"] == 1
+
+    assert scheduler.resume("job")
+    assert ran.wait(5)
+    assert ("job", "queued") in scheduler.states
+
+
+def test_cancel_queued_job(scheduler):
+    ran = threading.Event()
+    scheduler.submit("job", "bulk", lambda control: ran.set(), paused=True)
+    assert scheduler.cancel("job")
+    assert not scheduler.resume("job")
+    time.sleep(0.2)
+    assert not ran.is_set()
+    assert scheduler.get_stats()["bulk"]["cancelled"] == 1
+    assert scheduler.states[-1] == ("job", "cancelled")
+
+
+def test_cancel_running_job_at_checkpoint(scheduler):
+    started, release = threading.Event(), threading.Event()
+    reached = []
+
+    def run(control):
+        started.set()
+        release.wait(5)
+        try:
+            control.checkpoint()
+        except JobCancelled:
+            reached.append("cancelled")
+            raise
+
+    scheduler.submit("job", "bulk", run)
+    wait_for(started.is_set)
+    assert scheduler.cancel("job")
+    release.set()
+    wait_for(lambda: scheduler.get_stats()["bulk"]["cancelled"] == 1)
+    assert reached == ["cancelled"]
@@ -0,0 +1,31 @@
+import pytest
+
+# shards imports the embedding store, which needs the model and Chroma
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from shards import merge_top_k
+
+
+def results(*scores):
+    return [{"chunk_id": f"c{score}", "score": score} for score in scores]
+
+
+def test_merges_distances_lowest_first():
+    merged = merge_top_k({"a": results(0.1, 0.4, 0.9), "b": results(0.2, 0.3)}, 4)
+
+    assert [result["score"] for result in merged] == [0.1, 0.2, 0.3, 0.4]
+    assert [result["shard"] for result in merged] == ["a", "b", "b", "a"]
+
+
+def test_merges_similarities_highest_first():
+    merged = merge_top_k({"a": results(9.0, 1.0), "b": results(5.0, 4.0)}, 3, higher_is_better=True)
+    assert [result["score"] for result in merged] == [9.0, 5.0, 4.0]
+
+
+def test_fewer_results_than_asked_and_inputs_untouched():
+    lists = {"a": results(0.1), "b": []}
+    merged = merge_top_k(lists, 5)
+
+    assert len(merged) == 1
+    assert "shard" not in lists["a"][0]
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from vector_backends import matches_where
+
+METADATA = {"doc_id": "h1", "year": 2023, "framework": "GRI", "page_number": 4}
+
+
+def test_equality_shorthand():
+    assert matches_where(METADATA, {"framework": "GRI"})
+    assert not matches_where(METADATA, {"framework": "SASB"})
+    assert not matches_where(METADATA, {"missing": "GRI"})
+
+
+def test_comparison_operators():
+    assert matches_where(METADATA, {"year": {"$gte": 2023}})
+    assert matches_where(METADATA, {"year": {"$gt": 2020, "$lt": 2024}})
+    assert not matches_where(METADATA, {"year": {"$lt": 2023}})
+    assert matches_where(METADATA, {"year": {"$ne": 2022}})
+    assert matches_where(METADATA, {"framework": {"$in": ["GRI", "TCFD"]}})
+    assert matches_where(METADATA, {"framework": {"$nin": ["SASB"]}})
+
+
+def test_missing_or_mistyped_values_do_not_match():
+    assert not matches_where(METADATA, {"missing": {"$gt": 1}})
+    assert not matches_where(METADATA, {"framework": {"$gt": 1}})
+
+
+def test_and_or():
+    assert matches_where(METADATA, {"$and": [{"framework": "GRI"}, {"year": {"$gte": 2020}}]})
+    assert not matches_where(METADATA, {"$and": [{"framework": "GRI"}, {"year": {"$lt": 2020}}]})
+    assert matches_where(METADATA, {"$or": [{"framework": "SASB"}, {"page_number": 4}]})
+    assert not matches_where(METADATA, {"$or": [{"framework": "SASB"}, {"page_number": 5}]})
+
+
+def test_unknown_operator_is_rejected():
+    with pytest.raises(ValueError):
+        matches_where(METADATA, {"year": {"$like": 2023}})
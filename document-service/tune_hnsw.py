@@ -0,0 +1,168 @@
+"""
+Tune the HNSW settings of a Chroma collection for recall against latency.
+
+Samples stored chunk embeddings as queries, computes their exact top-k by
+brute force, then builds HNSW indexes (the same hnswlib Chroma uses) for
+each M / construction_ef pair and measures recall@k and per-query latency
+at each search ef. The cheapest setting that meets the target recall is
+written to hnsw_tuning.json in the persist directory, which the document
+service applies to the collection: search_ef when it next starts, M and
+construction_ef when it next compacts (rebuilds) the collection.
+
+Usage:
+    python tune_hnsw.py --target-recall 0.95 --k 5
+    python tune_hnsw.py --m 16 32 --construction-ef 100 200 --ef 10 20 40 80
+    python tune_hnsw.py --apply    # apply now, rebuilding only if M or construction_ef changed (service stopped)
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import chromadb
+import hnswlib
+import numpy as np
+
+from embedding_store import EmbeddingStore
+from vector_backends import HNSW_DEFAULTS, save_hnsw_params
+
+
+def load_embeddings(collection, page_size: int = 1000) -> Tuple[List[str], np.ndarray]:
+    """Read every stored chunk ID and embedding from a collection."""
+    ids, embeddings = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        offset += len(page["ids"])
+    return ids, np.asarray(embeddings, dtype=np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact top-k row indexes by squared L2 distance (Chroma's default space)."""
+    distances = (vectors ** 2).sum(axis=1)[None, :] - 2.0 * queries @ vectors.T
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(np.take_along_axis(distances, top, axis=1), axis=1), axis=1)
+
+
+def measure(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, m: int, construction_ef: int, efs: List[int], threads: int) -> List[Dict[str, Any]]:
+    """Build one HNSW index and measure recall@k and latency at each search ef."""
+    index = hnswlib.Index(space="l2", dim=vectors.shape[1])
+    started = time.perf_counter()
+    index.init_index(max_elements=len(vectors), ef_construction=construction_ef, M=m)
+    index.add_items(vectors, np.arange(len(vectors)), num_threads=threads)
+    build_seconds = time.perf_counter() - started
+
+    results = []
+    for ef in efs:
+        index.set_ef(max(ef, k))
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            labels, _ = index.knn_query(query[None, :], k=k, num_threads=1)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            hits += len(set(labels[0].tolist()) & set(expected.tolist()))
+        results.append({
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": ef,
+            "recall": hits / (k * len(queries)),
+            "mean_latency_ms": float(np.mean(latencies)),
+            "p95_latency_ms": float(np.percentile(latencies, 95)),
+            "build_seconds": build_seconds
+        })
+    return results
+
+
+def apply_params(persist_directory: str, name: str, params: Dict[str, Any]):
+    """
+    Apply HNSW settings through the document service's store.
+
+    Opening the store sets search_ef in place; M and construction_ef need the
+    collection rebuilt, which the store's compaction does with the new
+    settings (and its crash-safe swap).
+    """
+    store = EmbeddingStore(persist_directory=persist_directory, collection_name=name, hnsw_params=params)
+    try:
+        if store.hnsw_rebuild_pending:
+            store.compact()
+            print(f"Rebuilt collection {name} with {params} ({store.collection.count()} chunks)")
+        else:
+            print(f"Applied {params} to collection {name} without a rebuild")
+    finally:
+        store.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune HNSW settings of a document-service collection")
+    parser.add_argument("--persist-directory", default="./chroma_db", help="ChromaDB persist directory")
+    parser.add_argument("--collection", default="esg_documents", help="Collection to tune")
+    parser.add_argument("--k", type=int, default=5, help="Results per query the recall is measured at")
+    parser.add_argument("--queries", type=int, default=200, help="Stored chunks sampled as queries")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Lowest acceptable recall@k")
+    parser.add_argument("--m", type=int, nargs="+", default=[HNSW_DEFAULTS["hnsw:M"]], help="M values to try")
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[HNSW_DEFAULTS["hnsw:construction_ef"]], help="construction_ef values to try")
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320], help="search_ef values to try")
+    parser.add_argument("--threads", type=int, default=4, help="Threads used to build each index")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the query sample")
+    parser.add_argument("--apply", action="store_true", help="Rebuild the collection with the chosen settings (stop the service first)")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.persist_directory)
+    collection = client.get_collection(name=args.collection)
+    ids, vectors = load_embeddings(collection)
+    if len(ids) <= args.k:
+        print(f"Collection {args.collection} has {len(ids)} chunks; nothing to tune")
+        return
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"Tuning {args.collection}: {len(ids)} chunks, {len(queries)} queries, recall@{args.k} target {args.target_recall}")
+
+    results = []
+    for m in args.m:
+        for construction_ef in args.construction_ef:
+            for result in measure(vectors, queries, truth, args.k, m, construction_ef, sorted(args.ef), args.threads):
+                results.append(result)
+                print(
+                    f"M={m:<4} construction_ef={construction_ef:<5} search_ef={result['hnsw:search_ef']:<5} "
+                    f"recall={result['recall']:.4f} mean={result['mean_latency_ms']:.3f}ms "
+                    f"p95={result['p95_latency_ms']:.3f}ms build={result['build_seconds']:.1f}s"
+                )
+
+    # Cheapest = lowest mean query latency among settings that meet the target
+    passing = [result for result in results if result["recall"] >= args.target_recall]
+    if not passing:
+        best = max(results, key=lambda result: result["recall"])
+        print(f"No setting reached recall {args.target_recall}; best was {best['recall']:.4f}. Try larger --ef or --m values.")
+        return
+    best = min(passing, key=lambda result: result["mean_latency_ms"])
+    params = {key: best[key] for key in ("hnsw:M", "hnsw:construction_ef", "hnsw:search_ef")}
+
+    save_hnsw_params(args.persist_directory, args.collection, params, {
+        "tuned_at": datetime.now(timezone.utc).isoformat(),
+        "chunks": len(ids),
+        "queries": len(queries),
+        "k": args.k,
+        "target_recall": args.target_recall,
+        "chosen": best,
+        "results": results
+    })
+    print(f"Chose {params}: recall={best['recall']:.4f}, mean latency {best['mean_latency_ms']:.3f}ms")
+
+    current = collection.metadata or {}
+    if any(current.get(key, HNSW_DEFAULTS[key]) != value for key, value in params.items()):
+        if args.apply:
+            apply_params(args.persist_directory, args.collection, params)
+        else:
+            print("The existing collection uses other settings; the service applies them on restart and compaction, or rerun with --apply (service stopped)")
+
+
+if __name__ == "__main__":
+    main()
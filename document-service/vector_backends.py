@@ -0,0 +1,538 @@
+import json
+import os
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKENDS = ("chroma", "flat")
+FLAT_INDEX_DTYPES = ("float16", "int8")
+
+# Rows scored per matmul block; bounds the float32 temporary for large indexes
+SCAN_BLOCK_ROWS = 16384
+INITIAL_CAPACITY = 1024
+
+# Chroma's own HNSW defaults; M and construction_ef are fixed once an index is built
+HNSW_DEFAULTS = {"hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+HNSW_TUNING_FILE = "hnsw_tuning.json"
+# Settings baked into the graph; search_ef is read at query time and changes in place
+HNSW_BUILD_KEYS = ("hnsw:M", "hnsw:construction_ef")
+
+
+def load_hnsw_params(persist_directory: str, collection_name: str) -> Dict[str, Any]:
+    """HNSW settings recorded for a collection by tune_hnsw.py, or {} if none."""
+    path = os.path.join(persist_directory, HNSW_TUNING_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get(collection_name, {}).get("params", {})
+    except Exception as e:
+        logger.error(f"Error loading HNSW tuning file {path}: {str(e)}")
+        return {}
+
+
+def save_hnsw_params(persist_directory: str, collection_name: str, params: Dict[str, Any], report: Dict[str, Any]):
+    """Record tuned HNSW settings (and the measurements behind them) for a collection."""
+    path = os.path.join(persist_directory, HNSW_TUNING_FILE)
+    data = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            data = json.load(f)
+    data[collection_name] = {"params": params, "report": report}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def resolve_hnsw_params(persist_directory: str, collection_name: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Chroma defaults, then tuned settings, then explicit overrides (None values ignored)."""
+    params = dict(HNSW_DEFAULTS)
+    params.update(load_hnsw_params(persist_directory, collection_name))
+    params.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    return params
+
+
+def hnsw_mismatches(metadata: Optional[Dict[str, Any]], hnsw_params: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """HNSW settings whose value in a collection's metadata differs from hnsw_params, as (current, wanted)."""
+    current = metadata or {}
+    return {
+        key: (current.get(key, HNSW_DEFAULTS.get(key)), value)
+        for key, value in hnsw_params.items()
+        if current.get(key, HNSW_DEFAULTS.get(key)) != value
+    }
+
+
+def open_chroma_collection(client, name: str, embedding_function, hnsw_params: Dict[str, Any], description: str = "ESG document chunks"):
+    """
+    Get a Chroma collection, creating it with the given HNSW settings if new.
+
+    A changed search_ef is applied to an existing collection in place. M and
+    construction_ef only change by rebuilding, so a mismatch there is logged
+    and applied by the next compaction (POST /admin/compact or
+    tune_hnsw.py --apply).
+    """
+    try:
+        collection = client.get_collection(name=name, embedding_function=embedding_function)
+    except ValueError:
+        logger.info(f"Creating collection {name} with {hnsw_params}")
+        return client.create_collection(
+            name=name,
+            embedding_function=embedding_function,
+            metadata={"description": description, **hnsw_params}
+        )
+
+    mismatched = hnsw_mismatches(collection.metadata, hnsw_params)
+    if "hnsw:search_ef" in mismatched:
+        logger.info(f"Setting hnsw:search_ef of collection {name} to {hnsw_params['hnsw:search_ef']}")
+        collection.modify(metadata={**(collection.metadata or {}), "hnsw:search_ef": hnsw_params["hnsw:search_ef"]})
+    rebuild = {key: mismatched[key] for key in HNSW_BUILD_KEYS if key in mismatched}
+    if rebuild:
+        logger.warning(f"Collection {name} was built with different HNSW settings (current, wanted): {rebuild}; they apply at the next compaction")
+    return collection
+
+
+def matches_where(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma-style metadata filter against one chunk's metadata."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator not in ("$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte"):
+        raise ValueError(f"Unsupported where operator: {operator}")
+    try:
+        if operator == "$eq":
+            return value == operand
+        if operator == "$ne":
+            return value != operand
+        if operator == "$in":
+            return value in operand
+        if operator == "$nin":
+            return value not in operand
+        if value is None:
+            return False
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        # A value of another type (e.g. a string against a number) is not a match
+        return False
+
+
+def _where_document_sql(where_document: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma-style document filter into a SQL condition."""
+    clauses, params = [], []
+    for operator, operand in where_document.items():
+        if operator == "$contains":
+            clauses.append("instr(document, ?) > 0")
+            params.append(operand)
+        elif operator == "$not_contains":
+            clauses.append("instr(document, ?) = 0")
+            params.append(operand)
+        elif operator in ("$and", "$or"):
+            parts = [_where_document_sql(clause) for clause in operand]
+            joiner = " AND " if operator == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+        else:
+            raise ValueError(f"Unsupported where_document operator: {operator}")
+    return " AND ".join(clauses), params
+
+
+class FlatIndexBackend:
+    def __init__(self, index_directory: str, dtype: str = "float16"):
+        """
+        Exact-search vector index held in a memory-mapped matrix.
+
+        Embeddings are L2-normalized and stored as float16, or as int8 with a
+        per-row scale. A query is one blocked matmul over the matrix plus an
+        argpartition for the top k. Chunk texts and metadata live in SQLite;
+        IDs and metadata are also kept in memory for filtering. The matrix is
+        an ordinary file mapping, so worker processes on one host share it
+        through the OS page cache. A single process should write at a time.
+
+        Exposes the subset of the ChromaDB collection API the embedding store
+        uses (upsert, delete, get, query, count). Distances are squared L2
+        between normalized vectors (2 - 2 * cosine), the same scale as
+        Chroma's default space.
+
+        Args:
+            index_directory: Directory holding the matrix and record files
+            dtype: Storage type for embeddings, "float16" or "int8"
+        """
+        if dtype not in FLAT_INDEX_DTYPES:
+            raise ValueError(f"dtype must be one of {FLAT_INDEX_DTYPES}")
+
+        self.index_directory = index_directory
+        os.makedirs(index_directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._info_path = os.path.join(index_directory, "index.json")
+        self._vectors_path = os.path.join(index_directory, "vectors.dat")
+        self._scales_path = os.path.join(index_directory, "scales.dat")
+
+        info = {}
+        if os.path.exists(self._info_path):
+            with open(self._info_path, "r") as f:
+                info = json.load(f)
+        self.dtype = info.get("dtype", dtype)
+        if self.dtype != dtype:
+            logger.warning(f"Existing flat index uses {self.dtype}; ignoring requested {dtype}")
+        self.dim: Optional[int] = info.get("dim")
+        self.capacity: int = info.get("capacity", 0)
+        self.rows: int = info.get("rows", 0)
+
+        self._db = sqlite3.connect(os.path.join(index_directory, "records.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._db.commit()
+
+        # In-memory row maps, rebuilt from SQLite
+        self._ids: List[Optional[str]] = [None] * self.rows
+        self._metadatas: List[Optional[Dict[str, Any]]] = [None] * self.rows
+        self._row_of: Dict[str, int] = {}
+        for row, chunk_id, metadata in self._db.execute("SELECT row, id, metadata FROM chunks"):
+            self._ids[row] = chunk_id
+            self._metadatas[row] = json.loads(metadata) if metadata else {}
+            self._row_of[chunk_id] = row
+
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._live = np.zeros(self.capacity, dtype=bool)
+        if self.dim is not None and self.capacity:
+            self._map()
+            for row in self._row_of.values():
+                self._live[row] = True
+
+    @property
+    def deleted_rows(self) -> int:
+        """Rows occupied by deleted chunks (reclaimed by compaction)."""
+        return self.rows - len(self._row_of)
+
+    def _map(self):
+        storage = np.int8 if self.dtype == "int8" else np.float16
+        self._vectors = np.memmap(self._vectors_path, dtype=storage, mode="r+", shape=(self.capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r+", shape=(self.capacity,))
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < rows_needed:
+            capacity *= 2
+
+        # Grow the backing files in place; existing rows keep their offsets
+        item_size = 1 if self.dtype == "int8" else 2
+        self._vectors = None
+        self._scales = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * item_size)
+        if self.dtype == "int8":
+            with open(self._scales_path, "ab") as f:
+                f.truncate(capacity * 4)
+
+        live = np.zeros(capacity, dtype=bool)
+        live[:self.capacity] = self._live
+        self._live = live
+        self.capacity = capacity
+        self._map()
+
+    def _save_info(self):
+        tmp_path = f"{self._info_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dtype": self.dtype, "dim": self.dim, "capacity": self.capacity, "rows": self.rows}, f)
+        os.replace(tmp_path, self._info_path)
+
+    def _store_vectors(self, rows: List[int], embeddings: np.ndarray):
+        if self.dtype == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[rows] = np.round(embeddings / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._vectors[rows] = embeddings.astype(np.float16)
+
+    def _load_vectors(self, rows: List[int]) -> np.ndarray:
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= np.asarray(self._scales[rows])[:, None]
+        return vectors
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Insert chunks, overwriting any with the same IDs in place."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            rows = []
+            assigned: Dict[str, int] = {}
+            next_row = self.rows
+            for chunk_id in ids:
+                row = self._row_of.get(chunk_id, assigned.get(chunk_id))
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                assigned[chunk_id] = row
+                rows.append(row)
+
+            self._ensure_capacity(next_row)
+            if next_row > self.rows:
+                self._ids.extend([None] * (next_row - self.rows))
+                self._metadatas.extend([None] * (next_row - self.rows))
+                self.rows = next_row
+
+            self._store_vectors(rows, vectors)
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, chunk_id, document, json.dumps(metadata)) for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)]
+            )
+            self._db.commit()
+
+            for row, chunk_id, metadata in zip(rows, ids, metadatas):
+                self._ids[row] = chunk_id
+                self._metadatas[row] = metadata
+                self._row_of[chunk_id] = row
+                self._live[row] = True
+            self._save_info()
+
+    # Same semantics as upsert for this backend
+    add = upsert
+
+    def _filter_rows(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, where_document: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Rows of live chunks matching all given conditions, in row order."""
+        if ids is not None:
+            rows = sorted(self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of)
+        else:
+            rows = sorted(self._row_of.values())
+        if where:
+            rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+        if where_document:
+            sql, params = _where_document_sql(where_document)
+            matching = {row for (row,) in self._db.execute(f"SELECT row FROM chunks WHERE {sql}", params)}
+            rows = [row for row in rows if row in matching]
+        return rows
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, where_document: Optional[Dict[str, Any]] = None):
+        """Delete matching chunks; their rows are tombstoned until compaction."""
+        with self._lock:
+            rows = self._filter_rows(ids, where, where_document)
+            if not rows:
+                return
+            self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+            for row in rows:
+                del self._row_of[self._ids[row]]
+                self._ids[row] = None
+                self._metadatas[row] = None
+                self._live[row] = False
+
+    def _documents(self, chunk_ids: List[str]) -> List[str]:
+        documents = {}
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for chunk_id, document in self._db.execute(f"SELECT id, document FROM chunks WHERE id IN ({placeholders})", part):
+                    documents[chunk_id] = document
+        return [documents.get(chunk_id) for chunk_id in chunk_ids]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Fetch chunks by ID and/or filter, like Collection.get."""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            rows = self._filter_rows(ids, where, where_document)
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            chunk_ids = [self._ids[row] for row in rows]
+            return {
+                "ids": chunk_ids,
+                "documents": self._documents(chunk_ids) if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+                "embeddings": (self._load_vectors(rows).tolist() if rows else []) if "embeddings" in include else None
+            }
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Exact top-k search for each query embedding, like Collection.query."""
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            # Snapshot what the scan needs; the matmul itself runs without the lock.
+            # Compaction replaces these objects rather than mutating them, so row
+            # numbers stay consistent with this snapshot.
+            vectors, scales, rows_used = self._vectors, self._scales, self.rows
+            row_ids, row_metadatas = self._ids, self._metadatas
+            candidate_rows = None
+            if where or where_document:
+                candidate_rows = np.asarray(self._filter_rows(None, where, where_document), dtype=np.int64)
+            live = self._live[:rows_used].copy()
+
+        empty = {"ids": [[] for _ in queries], "distances": [[] for _ in queries], "documents": [[] for _ in queries], "metadatas": [[] for _ in queries], "embeddings": None}
+        if vectors is None or rows_used == 0 or (candidate_rows is not None and not len(candidate_rows)):
+            return empty
+
+        similarities = self._scan(vectors, scales, rows_used, queries, candidate_rows)
+        if candidate_rows is None:
+            similarities[:, ~live] = -np.inf
+            candidate_rows = np.arange(rows_used)
+        else:
+            similarities[:, ~live[candidate_rows]] = -np.inf
+
+        k = min(n_results, int(np.isfinite(similarities[0]).sum()))
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": None}
+        for query_similarities in similarities:
+            if k <= 0:
+                top = np.array([], dtype=np.int64)
+            else:
+                top = np.argpartition(-query_similarities, k - 1)[:k]
+                top = top[np.argsort(-query_similarities[top])]
+            # Skip rows deleted while the scan ran
+            hits = [(row, float(similarity)) for row, similarity in zip(candidate_rows[top].tolist(), query_similarities[top]) if row_ids[row] is not None]
+            chunk_ids = [row_ids[row] for row, _ in hits]
+            result["ids"].append(chunk_ids)
+            result["metadatas"].append([row_metadatas[row] for row, _ in hits])
+            result["documents"].append(self._documents(chunk_ids) if "documents" in include else None)
+            result["distances"].append([2.0 - 2.0 * similarity for _, similarity in hits])
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def compact(self) -> int:
+        """
+        Rewrite the index without deleted rows.
+
+        Live rows are copied into new files that replace the old ones, so
+        scans already running keep reading the old mapping safely.
+
+        Returns:
+            Number of rows reclaimed
+        """
+        with self._lock:
+            reclaimed = self.deleted_rows
+            if not reclaimed or self.dim is None:
+                return 0
+
+            live_rows = sorted(self._row_of.values())
+            capacity = max(INITIAL_CAPACITY, len(live_rows))
+            storage = np.int8 if self.dtype == "int8" else np.float16
+            vectors_tmp = f"{self._vectors_path}.compact"
+            vectors = np.memmap(vectors_tmp, dtype=storage, mode="w+", shape=(capacity, self.dim))
+            scales = None
+            if self.dtype == "int8":
+                scales_tmp = f"{self._scales_path}.compact"
+                scales = np.memmap(scales_tmp, dtype=np.float32, mode="w+", shape=(capacity,))
+            for start in range(0, len(live_rows), SCAN_BLOCK_ROWS):
+                block = live_rows[start:start + SCAN_BLOCK_ROWS]
+                vectors[start:start + len(block)] = self._vectors[block]
+                if scales is not None:
+                    scales[start:start + len(block)] = self._scales[block]
+            vectors.flush()
+            del vectors
+            if scales is not None:
+                scales.flush()
+                del scales
+
+            # Renumbering in ascending order never collides: each row moves to a
+            # slot that is free or was vacated by an earlier row
+            self._db.executemany(
+                "UPDATE chunks SET row = ? WHERE row = ?",
+                [(new_row, old_row) for new_row, old_row in enumerate(live_rows) if new_row != old_row]
+            )
+            self._db.commit()
+
+            os.replace(vectors_tmp, self._vectors_path)
+            if self.dtype == "int8":
+                os.replace(scales_tmp, self._scales_path)
+
+            # New objects rather than in-place edits; running queries hold the old ones
+            self._ids = [self._ids[row] for row in live_rows]
+            self._metadatas = [self._metadatas[row] for row in live_rows]
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+            self.rows = len(live_rows)
+            self.capacity = capacity
+            self._live = np.zeros(capacity, dtype=bool)
+            self._live[:self.rows] = True
+            self._map()
+            self._save_info()
+
+        logger.info(f"Compacted flat index: reclaimed {reclaimed} rows, {self.rows} remain")
+        return reclaimed
+
+    def _scan(self, vectors: np.memmap, scales: Optional[np.memmap], rows_used: int, queries: np.ndarray, candidate_rows: Optional[np.ndarray]) -> np.ndarray:
+        """Cosine similarity of every query against every (candidate) row, shape (queries, rows)."""
+        if candidate_rows is not None:
+            block = np.asarray(vectors[candidate_rows], dtype=np.float32)
+            if scales is not None:
+                block *= np.asarray(scales[candidate_rows])[:, None]
+            return queries @ block.T
+
+        similarities = np.empty((len(queries), rows_used), dtype=np.float32)
+        for start in range(0, rows_used, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, rows_used)
+            block = np.asarray(vectors[start:end], dtype=np.float32)
+            if scales is not None:
+                block *= np.asarray(scales[start:end])[:, None]
+            similarities[:, start:end] = queries @ block.T
+        return similarities
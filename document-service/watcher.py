@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# watchdog (inotify on Linux) is optional; without it the folder is polled
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+WATCH_MODES = ("auto", "events", "poll")
+
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "FolderWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.note(event.src_path, removed=False)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.note(event.src_path, removed=False)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.watcher.note(event.src_path, removed=True)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.note(event.src_path, removed=True)
+            self.watcher.note(event.dest_path, removed=False)
+
+
+class FolderWatcher:
+    def __init__(
+        self,
+        directory: str,
+        on_change: Callable[[List[str], List[str]], None],
+        debounce_seconds: float = 2.0,
+        poll_seconds: float = 5.0,
+        mode: str = "auto"
+    ):
+        """
+        Watch a folder for added, modified and removed PDFs.
+
+        File system events (inotify through watchdog) are used when watchdog
+        is installed; otherwise, or with mode "poll", the folder is rescanned
+        every poll_seconds and compared by size and modification time.
+        Events are debounced: a file is only reported once it has been quiet
+        for debounce_seconds (a whole poll interval when polling), so a file
+        still being copied is indexed once, and a burst of drops is handed
+        over as one batch. The files already in the folder are reported as
+        changed at start; removals are only reported when seen happening.
+
+        Args:
+            directory: Folder to watch (not recursive)
+            on_change: Called with (changed paths, removed paths) per batch
+            debounce_seconds: Quiet time before a changed file is reported
+            poll_seconds: Rescan interval when polling
+            mode: "auto" (events if watchdog is installed), "events" or "poll"
+        """
+        if mode not in WATCH_MODES:
+            raise ValueError(f"mode must be one of {WATCH_MODES}")
+        if mode == "events" and Observer is None:
+            raise ValueError("mode 'events' needs the watchdog package")
+        self.directory = directory
+        self.on_change = on_change
+        self.use_events = mode != "poll" and Observer is not None
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds if self.use_events else max(debounce_seconds, poll_seconds)
+        # Under a steady stream of events, report at least this often
+        self.max_delay_seconds = self.debounce_seconds * 10
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[bool, float]] = {}
+        self._first_pending: Optional[float] = None
+        self._stopped = threading.Event()
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        self._scan: Dict[str, Tuple[int, int]] = {}
+        self.stats = {"batches": 0, "changed": 0, "removed": 0, "events": 0}
+
+    def note(self, path: str, removed: bool):
+        """Record a file event; the file is reported once it has been quiet long enough."""
+        if not _is_pdf(path) or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.directory):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pending[os.path.abspath(path)] = (removed, now)
+            if self._first_pending is None:
+                self._first_pending = now
+            self.stats["events"] += 1
+
+    def _scan_folder(self) -> Dict[str, Tuple[int, int]]:
+        scan = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and _is_pdf(entry.name):
+                        info = entry.stat()
+                        scan[os.path.abspath(entry.path)] = (info.st_size, info.st_mtime_ns)
+        except FileNotFoundError:
+            logger.warning(f"Watch folder {self.directory} does not exist")
+        return scan
+
+    def _poll(self):
+        scan = self._scan_folder()
+        for path, signature in scan.items():
+            if self._scan.get(path) != signature:
+                self.note(path, removed=False)
+        for path in self._scan.keys() - scan.keys():
+            self.note(path, removed=True)
+        self._scan = scan
+
+    def _due(self) -> Tuple[List[str], List[str]]:
+        now = time.monotonic()
+        changed, removed = [], []
+        with self._lock:
+            overdue = self._first_pending is not None and now - self._first_pending >= self.max_delay_seconds
+            for path, (is_removed, seen) in list(self._pending.items()):
+                if overdue or now - seen >= self.debounce_seconds:
+                    del self._pending[path]
+                    (removed if is_removed else changed).append(path)
+            self._first_pending = min((seen for _, seen in self._pending.values()), default=None)
+        # A file that reappeared, or vanished again, is reported as it is now
+        changed = [path for path in changed if os.path.exists(path)]
+        removed = [path for path in removed if not os.path.exists(path)]
+        return sorted(changed), sorted(removed)
+
+    def _run(self):
+        interval = min(self.debounce_seconds, self.poll_seconds) / 2
+        last_poll = time.monotonic()
+        while not self._stopped.wait(interval):
+            if not self.use_events and time.monotonic() - last_poll >= self.poll_seconds:
+                self._poll()
+                last_poll = time.monotonic()
+            changed, removed = self._due()
+            if not changed and not removed:
+                continue
+            self.stats["batches"] += 1
+            self.stats["changed"] += len(changed)
+            self.stats["removed"] += len(removed)
+            logger.info(f"Watch folder batch: {len(changed)} changed, {len(removed)} removed")
+            try:
+                self.on_change(changed, removed)
+            except Exception as e:
+                logger.error(f"Error handling watch folder changes: {str(e)}")
+
+    def start(self):
+        """Report the folder's current PDFs, then start watching."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan = self._scan_folder()
+        for path in self._scan:
+            self.note(path, removed=False)
+
+        if self.use_events:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.directory, recursive=False)
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="folder-watcher")
+        self._thread.start()
+        logger.info(f"Watching {self.directory} ({'events' if self.use_events else 'polling'})")
+
+    def stop(self):
+        self._stopped.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "directory": self.directory,
+            "mode": "events" if self.use_events else "poll",
+            "pending": pending,
+            **self.stats
+        }
@@ -1,11 +1,40 @@
 import httpx
 from sentence_transformers import SentenceTransformer
 import logging
+import threading
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Use MPNet instead of MiniLM for query embeddings for better accuracy (though slightly slower)
+QUERY_EMBEDDING_MODEL = "all-mpnet-base-v2"
+
+# Process-wide model registry: each model is loaded once, on first use
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name):
+    """
+    Return the shared instance of a sentence-transformers model, loading it on first use.
+    
+    Args:
+        model_name (str): Name of the sentence-transformers model
+        
+    Returns:
+        SentenceTransformer: The process-wide model instance
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    
+    with _models_lock:
+        if model_name not in _models:
+            logger.info(f"Loading sentence-transformers model: {model_name}")
+            _models[model_name] = SentenceTransformer(model_name)
+            logger.info("Model loaded successfully")
+        return _models[model_name]
+
 class NLPProcessor:
     def __init__(self, document_service_url, model_name="all-MiniLM-L6-v2"):
         """
@@ -16,12 +45,11 @@ class NLPProcessor:
             model_name (str): Name of the sentence-transformers model to use
         """
         self.document_service_url = document_service_url
-        logger.info(f"Loading sentence-transformers model: {model_name}")
         
-        # Load the sentence transformer model - this will download the model on first run
+        # The sentence transformer model is loaded lazily through the shared registry -
+        # this will download the model on first use
         # all-MiniLM-L6-v2 is a good balance of speed and accuracy for beginners
-        self.model = SentenceTransformer(model_name)
-        logger.info("Model loaded successfully")
+        self.model_name = model_name
         
         # Initialize HTTP client for async requests
         self.http_client = httpx.AsyncClient(timeout=30.0)  # 30 second timeout
@@ -39,14 +67,18 @@ class NLPProcessor:
         try:
             # Pre-process the query for better results
             processed_text = text.lower().strip()
-            # Use MPNet instead of MiniLM for better accuracy (though slightly slower)
-            self.model = SentenceTransformer('all-mpnet-base-v2')
-            embedding = self.model.encode(processed_text)
+            # Reuse the shared MPNet instance instead of reloading it on every call
+            embedding = get_model(QUERY_EMBEDDING_MODEL).encode(processed_text)
             return embedding.tolist()
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             raise
     
+    @property
+    def model(self):
+        """The shared instance of this processor's sentence transformer model."""
+        return get_model(self.model_name)
+    
     async def search_documents(self, query):
         """
         Send the query to the Document Service to search for relevant chunks.
@@ -60,7 +60,7 @@ async def process_query(request: QueryRequest):
         # 3. Get the relevant chunks from the Document Service
         try:
             chunks = document_response.json()
-            print(f"Document service returned: {json.dumps(chunks, indent=2)}")
+            print(f"Document service returned {len(chunks)} chunks")
         except json.JSONDecodeError:
             print(f"Failed to parse JSON from response: {document_response.text}")
             chunks = []
@@ -198,23 +198,12 @@ def rerank_chunks(chunks, query):
 
 # Hybrid retrieval approach
 def hybrid_search(query, n_results=5):
-    # Get semantic search results
-    semantic_results = requests.post(
+    # The Document Service runs semantic and keyword search concurrently
+    # and fuses them with reciprocal rank fusion in a single call
+    return requests.post(
         f"{DOCUMENT_SERVICE_URL}/search",
-        json={"query": query, "n_results": n_results}
+        json={"query": query, "n_results": n_results, "mode": "hybrid"}
     ).json()
-    
-    # Get keyword search results (if you add this endpoint to Document Service)
-    keyword_results = requests.post(
-        f"{DOCUMENT_SERVICE_URL}/keyword_search",
-        json={"query": query, "n_results": n_results}
-    ).json()
-    
-    # Combine and deduplicate results
-    all_results = semantic_results + keyword_results
-    unique_results = {result.get("chunk_id"): result for result in all_results}
-    
-    return list(unique_results.values())
 
 def preprocess_query(query):
     # Expand ESG acronyms